@@ -0,0 +1,355 @@
+"""
+Benchmarks of proman's hot paths, run against local dummy children.
+
+    python benchmarks/bench.py --sizes 10 100 1000 --output results.json
+    python benchmarks/bench.py --compare results.json
+
+Every benchmark is run once per size (number of processes) and reports a few
+metrics. Metrics ending in _ms or _s are better lower, metrics ending in
+_per_s are better higher. Results are written as JSON, and --compare reports
+the metrics of the run that regressed against a previous results file by more
+than --tolerance, exiting with status 1 if any did.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Run from a checkout, whether or not proman is installed.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proman.config import ConfigParser  # noqa: E402
+
+# Dummy children, all of them shell commands.
+SLEEP = "exec sleep 3600"
+ECHO = "echo ready; exec sleep 3600"
+CRASH = "exit 1"
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__.replace("bench_", "")] = func
+    return func
+
+
+# ------------------------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------------------------
+
+
+def write_config(directory, n, command, **options):
+    """Write a configuration of n ShellProcesses running command."""
+    lines = []
+    for index in range(n):
+        lines.append(f"p{index}: !ShellProcess")
+        lines.append(f"  command: {json.dumps(command)}")
+        for key, value in options.items():
+            lines.append(f"  {key}: {json.dumps(value)}")
+    path = Path(directory) / f"bench-{n}.yaml"
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def load_manager(directory, n, command, **options):
+    """A ProcessManager with n registered but not yet started processes."""
+    path = write_config(directory, n, command, active=False, **options)
+    return ConfigParser(path, cache=False).init_process_manager()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p99_ms": round(
+            samples[min(len(samples) - 1, len(samples) * 99 // 100)] * 1000, 3
+        ),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+# ------------------------------------------------------------------------------
+# Benchmarks
+# ------------------------------------------------------------------------------
+
+
+@benchmark
+def bench_config(n, directory, options):
+    """Parse a configuration of n processes, cold and from the parse cache."""
+    path = write_config(directory, n, SLEEP, tags=["bench"], restart="on-failure")
+    # Best of a few runs, these are short enough for noise to dominate.
+    cold = min(timed(ConfigParser(path, cache=False).parse) for _ in range(3))
+    os.environ["PROMAN_CACHE_DIR"] = str(Path(directory) / "cache")
+    ConfigParser(path).parse()
+    cached = min(timed(ConfigParser(path).parse) for _ in range(5))
+    return {"cold_s": round(cold, 6), "cached_s": round(cached, 6)}
+
+
+@benchmark
+def bench_startup(n, directory, options):
+    """Start n sleeping children, then n children that must print a line first."""
+    results = {}
+    for label, command, extra in (
+        ("spawn", SLEEP, {}),
+        ("ready", ECHO, {"readiness": {"log_line": "ready"}}),
+    ):
+        manager = load_manager(directory, n, command, **extra)
+        elapsed = timed(
+            manager.start_processes,
+            list(manager.processes),
+            max_workers=options.max_workers,
+        )
+        running = sum(p.status == "running" for p in manager.processes.values())
+        manager.shutdown()
+        results[f"{label}_s"] = round(elapsed, 4)
+        results[f"{label}_per_s"] = round(running / elapsed, 1)
+    return results
+
+
+@benchmark
+def bench_stop(n, directory, options):
+    """Stop n children with stop_all (dependency order) and with shutdown."""
+    results = {}
+    for label in ("stop_all", "shutdown"):
+        manager = load_manager(directory, n, SLEEP)
+        manager.start_processes(
+            list(manager.processes), max_workers=options.max_workers
+        )
+        stop = manager.stop_all if label == "stop_all" else manager.shutdown
+        results[f"{label}_s"] = round(timed(stop), 4)
+    return results
+
+
+@benchmark
+def bench_crash_detection(n, directory, options):
+    """
+    Time from a SIGKILL of a child, outside of proman, until the manager
+    handles its exit.
+    """
+    manager = load_manager(directory, n, SLEEP)
+    manager.start_processes(list(manager.processes), max_workers=options.max_workers)
+    handled = {}
+    on_exit = manager.supervisor.on_exit
+
+    def record_exit(process, returncode):
+        on_exit(process, returncode)
+        if process.name in handled:
+            handled[process.name].set()
+
+    manager.supervisor.on_exit = record_exit
+    samples = []
+    for process in list(manager.processes.values())[: options.samples]:
+        handled[process.name] = threading.Event()
+        started = time.perf_counter()
+        os.kill(process.process.pid, signal.SIGKILL)
+        if handled[process.name].wait(10):
+            samples.append(time.perf_counter() - started)
+    manager.shutdown()
+    return percentiles(samples)
+
+
+@benchmark
+def bench_crash_loop(n, directory, options):
+    """
+    Run n children that exit at once and are restarted without delay until
+    they are declared crash looping: the full exit, restart and spawn cycle.
+    """
+    restarts = 20
+    manager = load_manager(
+        directory,
+        n,
+        CRASH,
+        restart="on-failure",
+        backoff={"initial": 0, "jitter": 0},
+        crash_loop={"max_restarts": restarts, "window": 600},
+    )
+    started = time.perf_counter()
+    manager.start_processes(list(manager.processes), max_workers=options.max_workers)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline and any(
+        p.status != "failed" for p in manager.processes.values()
+    ):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    total = sum(p.restart_count for p in manager.processes.values())
+    manager.shutdown()
+    return {"elapsed_s": round(elapsed, 4), "restarts_per_s": round(total / elapsed, 1)}
+
+
+@benchmark
+def bench_api(n, directory, options):
+    """
+    Latency and throughput of /api/status and /api/info through FastAPI's
+    test client, with n running processes. status_churn invalidates a process
+    before every request, as if one changed state each time.
+    """
+    from fastapi.testclient import TestClient
+
+    from proman.server import ProcessManagerWebInterface
+
+    path = write_config(directory, n, SLEEP)
+    interface = ProcessManagerWebInterface(
+        str(path), headless=True, max_workers=options.max_workers
+    )
+    interface.manager.metrics.stop()
+    names = list(interface.manager.processes)
+    results = {}
+    with TestClient(interface.app) as client:
+        for label, url, before in (
+            ("status", "/api/status", None),
+            ("status_all", "/api/status?fields=all", None),
+            ("status_churn", "/api/status", interface.manager.snapshot.invalidate),
+            ("info", "/api/info/{name}", None),
+        ):
+            samples = []
+            for index in range(options.requests):
+                name = names[index % len(names)]
+                if before is not None:
+                    before(name)
+                started = time.perf_counter()
+                response = client.get(url.format(name=name))
+                samples.append(time.perf_counter() - started)
+                response.raise_for_status()
+            samples = samples[len(samples) // 10 :]
+            results.update(
+                {f"{label}_{key}": value for key, value in percentiles(samples).items()}
+            )
+            results[f"{label}_per_s"] = round(len(samples) / sum(samples), 1)
+    return results
+
+
+# ------------------------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------------------------
+
+
+def run(names, sizes, options):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="proman-bench-") as directory:
+        for name in names:
+            for n in sizes:
+                print(f"{name} n={n} ...", file=sys.stderr, flush=True)
+                metrics = BENCHMARKS[name](n, directory, options)
+                results.append({"benchmark": name, "n": n, "metrics": metrics})
+                print(f"  {metrics}", file=sys.stderr, flush=True)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return the metrics that got worse than in baseline by more than tolerance."""
+    previous = {
+        (entry["benchmark"], entry["n"], metric): value
+        for entry in baseline["results"]
+        for metric, value in entry["metrics"].items()
+    }
+    regressions = []
+    for entry in results:
+        for metric, value in entry["metrics"].items():
+            before = previous.get((entry["benchmark"], entry["n"], metric))
+            if not before or not value:
+                continue
+            if metric.endswith("_per_s"):
+                change = before / value - 1
+            else:
+                change = value / before - 1
+            if change > tolerance:
+                regressions.append(
+                    (entry["benchmark"], entry["n"], metric, before, value)
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark proman")
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"Benchmarks to run, among {', '.join(BENCHMARKS)} (default: all)",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[10, 100, 1000],
+        help="Numbers of processes",
+    )
+    parser.add_argument("--max-workers", type=int, default=32, help="Concurrent spawns")
+    parser.add_argument(
+        "--requests", type=int, default=500, help="Requests per API endpoint"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=100, help="Kills per crash detection run"
+    )
+    parser.add_argument("--output", default=None, help="Write the results to this file")
+    parser.add_argument(
+        "--compare", default=None, help="Results file of a previous run to compare with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Relative slowdown reported as a regression (default: 0.25)",
+    )
+    options = parser.parse_args()
+    unknown = set(options.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Exits and crash loops are expected here, proman does not need to report them.
+    logging.getLogger("proman").setLevel(logging.CRITICAL)
+    results = run(options.benchmarks or list(BENCHMARKS), options.sizes, options)
+    report = {"environment": environment(), "results": results}
+    if options.output:
+        Path(options.output).write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if options.compare:
+        baseline = json.loads(Path(options.compare).read_text())
+        regressions = compare(results, baseline, options.tolerance)
+        for name, n, metric, before, after in regressions:
+            print(
+                f"REGRESSION {name} n={n} {metric}: {before} -> {after}",
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@
 Example of extension file that defines a "StreamlitProcess" to run streamlit python scripts.
 """
 
-import subprocess
 import sys
 
 from proman.processes import Process
@@ -31,12 +30,7 @@ class StreamlitProcess(Process):
             "--server.headless",
             "true",
         ]
-        self.process = subprocess.Popen(cmd)
-
-    def stop(self):
-        self.process.terminate()
-        self.process.wait(timeout=5)
-        self.status = "stopped"
+        self.process = self.spawn(cmd)
 
     def describe(self):
         return {
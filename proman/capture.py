@@ -0,0 +1,156 @@
+import os
+import selectors
+import threading
+from collections import deque
+from pathlib import Path
+
+from proman.events import Notifier
+
+
+class LogBuffer:
+    """
+    Keeps the most recent max_bytes of a process output in memory.
+    When a log directory is configured, the whole output is also appended to
+    <log_dir>/<name>.log, rotated to .1, .2, ... once it exceeds
+    max_file_bytes. Offsets count every byte ever written, so followers can
+    keep reading from where they stopped.
+    """
+
+    def __init__(
+        self,
+        name,
+        collector,
+        max_bytes=1 << 20,
+        log_dir=None,
+        max_file_bytes=10 << 20,
+        backups=3,
+    ):
+        self.name = name
+        self.collector = collector
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.backups = backups
+        self.filepath = Path(log_dir) / f"{name}.log" if log_dir else None
+        self.total = 0
+        self._chunks = deque()
+        self._size = 0
+        self._file = None
+        self._notifier = Notifier()
+        self._lock = threading.Lock()
+
+    def attach(self, pipe):
+        """Capture everything written to pipe until it is closed."""
+        self.collector.register(self, pipe)
+
+    def write(self, data):
+        with self._lock:
+            self._chunks.append(data)
+            self._size += len(data)
+            self.total += len(data)
+            while self._size > self.max_bytes:
+                excess = self._size - self.max_bytes
+                if len(self._chunks[0]) <= excess:
+                    self._size -= len(self._chunks.popleft())
+                else:
+                    self._chunks[0] = self._chunks[0][excess:]
+                    self._size -= excess
+        if self.filepath is not None:
+            self._write_file(data)
+        self._notifier.notify()
+
+    def read(self, offset=None):
+        """
+        Return (data, offset): the buffered bytes written after offset, or the
+        whole buffer when offset is None or older than the buffer, together
+        with the offset to continue reading from.
+        """
+        with self._lock:
+            data = b"".join(self._chunks)
+            start = self.total - len(data)
+            if offset is not None and offset > start:
+                data = data[offset - start :]
+            return data, self.total
+
+    def tail(self, lines=100):
+        data, offset = self.read()
+        if lines is not None:
+            data = b"\n".join(data.split(b"\n")[-lines - 1 :])
+        return data, offset
+
+    def contains(self, text, offset=None):
+        return text.encode() in self.read(offset)[0]
+
+    async def wait(self, offset, timeout=None):
+        """Wait until output past offset is written or timeout expires."""
+        return await self._notifier.wait(lambda: self.total > offset, timeout)
+
+    def _write_file(self, data):
+        if self._file is None:
+            self.filepath.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.filepath, "ab")
+        self._file.write(data)
+        self._file.flush()
+        if self._file.tell() >= self.max_file_bytes:
+            self._file.close()
+            self._file = None
+            for index in range(self.backups - 1, 0, -1):
+                rotated = self.filepath.with_suffix(f".log.{index}")
+                if rotated.exists():
+                    os.replace(rotated, self.filepath.with_suffix(f".log.{index + 1}"))
+            os.replace(self.filepath, self.filepath.with_suffix(".log.1"))
+
+
+class OutputCollector:
+    """
+    Reads the output pipes of all processes from a single selector thread and
+    dispatches what it reads to their LogBuffers.
+    """
+
+    def __init__(self, log_dir=None):
+        self.log_dir = log_dir
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def buffer(self, name, **kwargs):
+        return LogBuffer(name, self, log_dir=self.log_dir, **kwargs)
+
+    def register(self, buffer, pipe):
+        os.set_blocking(pipe.fileno(), False)
+        with self._lock:
+            self._pending.append((buffer, pipe))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="proman-output", daemon=True
+                )
+                self._thread.start()
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.fileobj == self._wakeup_r:
+                    os.read(self._wakeup_r, 4096)
+                    with self._lock:
+                        pending, self._pending = self._pending, []
+                    for buffer, pipe in pending:
+                        self._selector.register(pipe, selectors.EVENT_READ, buffer)
+                    continue
+                try:
+                    data = os.read(key.fileobj.fileno(), 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if data:
+                    key.data.write(data)
+                else:
+                    self._selector.unregister(key.fileobj)
+                    key.fileobj.close()
@@ -1,12 +1,42 @@
 import argparse
 import importlib
+import logging
 from pathlib import Path
 
 from proman import server
-
-
-def run(config_filepath, host, port, headless):
-    app = server.ProcessManagerWebInterface(config_filepath, headless)
+from proman.federation import parse_peer
+from proman.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    config_filepath,
+    host,
+    port,
+    headless,
+    max_workers=None,
+    log_dir=None,
+    watch=False,
+    state_file=None,
+    streaming=False,
+    max_tasks=4,
+    peers=None,
+    node_name=None,
+):
+    app = server.ProcessManagerWebInterface(
+        config_filepath,
+        headless,
+        max_workers,
+        log_dir,
+        state_file,
+        streaming,
+        max_tasks,
+        peers,
+        node_name,
+    )
+    if watch:
+        app.watch_config()
     app.run(host=host, port=port)
 
 
@@ -54,15 +84,91 @@ def main():
         action="store_true",
         help="Run in headless mode (no web interface)",
     )
+    run_parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="Start active processes concurrently, at most N spawns at once",
+    )
+    run_parser.add_argument(
+        "--max-tasks",
+        type=int,
+        default=4,
+        help="Run at most N task runs at once (default: 4)",
+    )
+    run_parser.add_argument(
+        "--log-dir",
+        default=None,
+        help="Directory where the output of every process is written (rotated)",
+    )
+    run_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Reload the configuration whenever the file changes",
+    )
+    run_parser.add_argument(
+        "--state-file",
+        default=None,
+        help="File recording the running children, re-adopted when proman restarts",
+    )
+    run_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Start processes while the configuration is still being parsed",
+    )
+    run_parser.add_argument(
+        "--peer",
+        action="append",
+        default=[],
+        metavar="NAME=URL",
+        help="Federate the remote proman at URL under NAME (repeatable)",
+    )
+    run_parser.add_argument(
+        "--peer-timeout",
+        type=float,
+        default=2.0,
+        help="Seconds to wait for a peer before using its last known state (default: 2)",
+    )
+    run_parser.add_argument(
+        "--node-name",
+        default=None,
+        help="Name of this instance among its peers (default: the host name)",
+    )
+    run_parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Minimum level of the logs of proman (default: INFO)",
+    )
+    run_parser.add_argument(
+        "--log-format",
+        default="json",
+        choices=["json", "text"],
+        help="Format of the logs of proman, written to stderr (default: json)",
+    )
     args = parser.parse_args()
 
     if args.command == "run":
-        print(f"Running with config: {args.configfilepath}")
+        setup_logging(args.log_level, args.log_format)
+        logger.info("Running", extra={"config": args.configfilepath})
         if args.extension:
-            print(f"Loading extensions: {args.extension}")
+            logger.info("Loading extensions", extra={"extensions": args.extension})
             extend_proman(args.extension)
 
-        run(args.configfilepath, host=args.host, port=args.port, headless=args.headless)
+        run(
+            args.configfilepath,
+            host=args.host,
+            port=args.port,
+            headless=args.headless,
+            max_workers=args.max_workers,
+            log_dir=args.log_dir,
+            watch=args.watch,
+            state_file=args.state_file,
+            streaming=args.stream,
+            max_tasks=args.max_tasks,
+            peers=[parse_peer(spec, args.peer_timeout) for spec in args.peer],
+            node_name=args.node_name,
+        )
     else:
         print(
             "Usage: proman run <configfilepath> [--extension <path/to/file1.py> <path/to/file2> ...] [--host <host>] [--port <port>]"
@@ -1,25 +1,60 @@
 import ast
+import hashlib
+import io
+import json
+import logging
+import os
+from pathlib import Path
 
 import yaml
+from yaml.composer import Composer
 
+from proman.environment import interpreter_cache
+from proman.groups import ProcessGroup
 from proman.manager import ProcessManager
+from proman.paths import cache_dir
 from proman.processes import Process
+from proman.scheduler import dependency_levels
+from proman.state import StateStore
+
+logger = logging.getLogger(__name__)
 
 
 # ------------------------------------------------------------------------------
 # YAML Multi-Constructor for Process classes.
 # ------------------------------------------------------------------------------
+
+
+class ProcessSpec:
+    """
+    A process definition as parsed from YAML: the name of its Process class
+    and its configuration. Processes are only instantiated from their spec
+    once the whole entry is known, so that parsing stays cheap and cacheable.
+    """
+
+    def __init__(self, class_name, config):
+        self.class_name = class_name
+        self.config = config
+
+    def instantiate(self, name):
+        cls = Process.registry.get(self.class_name)
+        if cls is None:
+            raise ValueError(f"Unknown process class: {self.class_name}")
+        instance = cls()
+        instance._initialize(self.config)
+        # If the process's name wasn’t set during initialization, inject it.
+        if getattr(instance, "name", None) is None:
+            instance.name = name
+        return instance
+
+
 def process_multi_constructor(loader, tag_suffix, node):
     """
     Handles YAML tags like !PythonProcess, !ShellProcess, or !CustomProcess.
-    It looks up the Process subclass in the registry, parses the node into a
-    configuration dictionary, instantiates the process using an empty constructor,
-    and then calls _initialize() with the parsed configuration.
+    It parses the node into a configuration dictionary and returns it as a
+    ProcessSpec, instantiated into the Process subclass registered under the
+    tag later on.
     """
-    cls = Process.registry.get(tag_suffix)
-    if cls is None:
-        raise ValueError(f"Unknown process class: {tag_suffix}")
-
     # Parse the node into a config dictionary.
     if isinstance(node, yaml.ScalarNode):
         scalar_val = loader.construct_scalar(node).strip()
@@ -45,14 +80,156 @@ def process_multi_constructor(loader, tag_suffix, node):
     else:
         raise ValueError(f"Unsupported node type {node} for process class {tag_suffix}")
 
-    # Instantiate the process with an empty constructor and initialize it.
-    instance = cls()
-    instance._initialize(config_dict)
-    return instance
+    return ProcessSpec(tag_suffix, config_dict)
+
 
+# The libyaml based loader is several times faster, when PyYAML was built with it.
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 # Register the multi-constructor for all YAML tags starting with "!"
 yaml.add_multi_constructor("!", process_multi_constructor, Loader=yaml.SafeLoader)
+yaml.add_multi_constructor("!", process_multi_constructor, Loader=Loader)
+
+
+class StreamingLoader(Loader):
+    """Loader composing the nodes of the parser events one entry at a time."""
+
+    compose_node = Composer.compose_node
+    compose_scalar_node = Composer.compose_scalar_node
+    compose_sequence_node = Composer.compose_sequence_node
+    compose_mapping_node = Composer.compose_mapping_node
+
+
+def iter_entries(stream):
+    """
+    Yield the (name, value) pairs of the top-level mapping of a YAML stream
+    one at a time, as soon as each of them is parsed.
+    """
+    loader = StreamingLoader(stream)
+    loader.anchors = {}
+    try:
+        loader.get_event()  # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise ConfigError(["The configuration must be a mapping of processes"])
+        loader.get_event()
+        while not loader.check_event(yaml.MappingEndEvent):
+            # The events come from libyaml when available, the nodes are
+            # composed one top-level entry at a time.
+            key = loader.compose_node(None, None)
+            value = loader.compose_node(None, None)
+            yield loader.construct_object(key, deep=True), loader.construct_object(
+                value, deep=True
+            )
+    finally:
+        loader.dispose()
+
+
+class ConfigError(ValueError):
+    """An invalid configuration, with every problem found in it."""
+
+    def __init__(self, errors, filepath=None):
+        self.errors = list(errors)
+        source = f" in {filepath}" if filepath else ""
+        super().__init__(
+            f"{len(self.errors)} error(s){source}:\n"
+            + "\n".join(f"  - {error}" for error in self.errors)
+        )
+
+
+class ParsedConfigCache:
+    """
+    Parsed configurations (name -> ProcessSpec) stored on disk as JSON, keyed
+    by the hash of the file content, so that an unchanged configuration is
+    never parsed twice. Only the max_entries most recently used ones are kept.
+    The cached commands are run by proman, so entries are only read from a
+    directory and files owned by the current user and writable by no one else.
+    Configurations JSON cannot represent exactly (dates, binary values, sets,
+    non-string keys) are not cached.
+    """
+
+    # Bumped whenever the format of the cached specs changes.
+    VERSION = b"2"
+
+    def __init__(self, directory=None, max_entries=16):
+        self.directory = Path(directory) if directory else cache_dir() / "configs"
+        self.max_entries = max_entries
+
+    def key(self, content):
+        return hashlib.sha256(self.VERSION + b"\0" + content).hexdigest()
+
+    def get(self, key):
+        path = self.directory / f"{key}.json"
+        try:
+            if not (_is_private(self.directory) and _is_private(path)):
+                logger.warning(
+                    "Ignoring the parsed configuration cache, writable by others",
+                    extra={"path": str(path)},
+                )
+                return None
+            specs = _decode_specs(json.loads(path.read_text()))
+            os.utime(path)
+            return specs
+        except Exception:
+            return None
+
+    def put(self, key, specs):
+        payload = _encode_specs(specs)
+        try:
+            if json.loads(json.dumps(payload)) != payload:
+                return
+        except (TypeError, ValueError):
+            return
+        try:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            tmp_path = self.directory / f"{key}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w") as cache_file:
+                json.dump(payload, cache_file, separators=(",", ":"))
+            os.replace(tmp_path, self.directory / f"{key}.json")
+            entries = sorted(
+                self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime
+            )
+            for stale in entries[: -self.max_entries]:
+                stale.unlink()
+        except OSError as e:
+            logger.warning(
+                "Could not save the parsed configuration cache",
+                extra={"path": str(self.directory), "error": str(e)},
+            )
+
+
+def _encode_specs(specs):
+    return {
+        name: (
+            {"class": spec.class_name, "config": spec.config}
+            if isinstance(spec, ProcessSpec)
+            else {"value": spec}
+        )
+        for name, spec in specs.items()
+    }
+
+
+def _decode_specs(payload):
+    return {
+        name: (
+            ProcessSpec(entry["class"], entry["config"])
+            if "class" in entry
+            else entry["value"]
+        )
+        for name, entry in payload.items()
+    }
+
+
+def _is_private(path):
+    # Owned by the current user, and writable neither by its group nor others.
+    if not hasattr(os, "getuid"):
+        return True
+    stat = os.stat(path)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
 
 # ------------------------------------------------------------------------------
 # ConfigParser that instantiates and initializes processes.
@@ -60,32 +237,194 @@ yaml.add_multi_constructor("!", process_multi_constructor, Loader=yaml.SafeLoade
 
 
 class ConfigParser:
-    def __init__(self, filepath):
+    def __init__(self, filepath, cache=True):
         self.filepath = filepath
+        self.cache = ParsedConfigCache() if cache else None
+        self.groups = {}
 
-    def parse(self):
-        with open(self.filepath, "r") as file:
-            config = yaml.load(file, Loader=yaml.SafeLoader)
+    def iter_specs(self):
+        """
+        Yield (name, spec) for every entry of the configuration, from the
+        cache when the file did not change, otherwise as the YAML is parsed.
+        """
+        with open(self.filepath, "rb") as file:
+            content = file.read()
+        key = self.cache.key(content) if self.cache is not None else None
+        specs = self.cache.get(key) if key is not None else None
+        if specs is not None:
+            yield from specs.items()
+            return
+
+        specs = {}
+        try:
+            stream = io.BytesIO(content)
+            # Named, so that syntax errors point at the file.
+            stream.name = str(self.filepath)
+            for name, spec in iter_entries(stream):
+                specs[name] = spec
+                yield name, spec
+        except yaml.YAMLError as e:
+            raise ConfigError([str(e)], self.filepath) from e
+        if key is not None:
+            self.cache.put(key, specs)
 
+    def load(self):
+        """Return the specs of the configuration, mapped by process name."""
+        return dict(self.iter_specs())
+
+    def instantiate(self, name, spec, errors, taken=()):
+        """
+        Turn one entry of the configuration into its processes: one, or one per
+        replica. Problems are appended to errors instead of being raised.
+        """
+        if not isinstance(spec, ProcessSpec):
+            errors.append(f"Process {name} is not tagged with a process class")
+            return []
+        try:
+            if "replicas" not in spec.config:
+                return [spec.instantiate(name)]
+            # Processes with replicas expand into one instance per replica.
+            cls = Process.registry.get(spec.class_name)
+            if cls is None:
+                raise ValueError(f"Unknown process class: {spec.class_name}")
+            group = ProcessGroup(name, cls, spec.config)
+            replicas = [group.instantiate(index) for index in range(group.replicas)]
+        except Exception as e:
+            errors.append(f"Process {name}: {e}")
+            return []
+        clashes = [replica.name for replica in replicas if replica.name in taken]
+        for clash in clashes:
+            errors.append(f"Process {clash} clashes with a replica of {name}")
+        if clashes:
+            return []
+        self.groups[name] = group
+        return replicas
+
+    def parse(self):
+        """
+        Parse and validate the whole configuration. Every problem found is
+        reported at once, in a single ConfigError.
+        """
+        specs = self.load()
+        errors = []
         processes = {}
-        # Each key in the YAML mapping corresponds to a process name.
-        # The value is already a fully initialized Process instance.
-        for process_name, process_instance in config.items():
-            if not isinstance(process_instance, Process):
-                raise ValueError(
-                    f"Process {process_name} did not produce a valid Process instance"
-                )
-            # If the process's name wasn’t set during initialization, inject it.
-            if getattr(process_instance, "name", None) is None:
-                process_instance.name = process_name
-            processes[process_name] = process_instance
+        for name, spec in specs.items():
+            for process in self.instantiate(name, spec, errors, taken=specs):
+                processes[process.name] = process
+        self._resolve_groups(processes)
+        self._validate_dependencies(processes, errors)
+        if errors:
+            raise ConfigError(errors, self.filepath)
+        self._probe_interpreters(processes)
         return processes
 
-    def init_process_manager(self):
+    def _resolve_groups(self, processes):
+        # Depending on a group means depending on all of its replicas.
+        for proc in processes.values():
+            for dependency in proc.depends_on:
+                if dependency in self.groups:
+                    self.groups[dependency].dependents.add(proc.name)
+            proc.depends_on = [
+                name
+                for dependency in proc.depends_on
+                for name in (
+                    self.groups[dependency].replica_names()
+                    if dependency in self.groups
+                    else [dependency]
+                )
+            ]
+
+    def _validate_dependencies(self, processes, errors):
+        unknown = [
+            f"Process '{name}' depends on unknown process '{dependency}'"
+            for name, proc in processes.items()
+            for dependency in proc.depends_on
+            if dependency not in processes
+        ]
+        errors.extend(unknown)
+        if not unknown:
+            try:
+                dependency_levels(processes)
+            except ValueError as e:
+                errors.append(str(e))
+
+    def _probe_interpreters(self, processes):
+        # Probe all configured interpreters in one batch, so that starting the
+        # processes only hits the (persisted) interpreter cache.
+        interpreter_paths = [
+            proc.interpreter_path
+            for proc in processes.values()
+            if getattr(proc, "interpreter_path", None)
+        ]
+        if interpreter_paths:
+            interpreter_cache.probe(interpreter_paths)
+            interpreter_cache.save()
+
+    def init_process_manager(
+        self,
+        max_workers=None,
+        log_dir=None,
+        state_file=None,
+        streaming=False,
+        max_tasks=4,
+    ):
+        """
+        Build a ProcessManager from the configuration file and start the active
+        processes along their dependency graph. When max_workers is given, the
+        processes of each dependency level are started concurrently, with at
+        most max_workers spawns at once. The captured output of every process is
+        also written to log_dir, when given. With a state_file, children left
+        running by a previous proman instance are re-adopted rather than
+        started again.
+        With streaming, processes are registered while the configuration is
+        parsed, and those without dependencies are started right away.
+        At most max_tasks runs of TaskProcesses run at once.
+        """
+        state = StateStore(state_file) if state_file else None
+        manager = ProcessManager(log_dir=log_dir, state=state, max_tasks=max_tasks)
+        if streaming:
+            return self._stream_into(manager, max_workers)
+
         processes = self.parse()
-        manager = ProcessManager()
+        manager.groups = self.groups
         for _, proc in processes.items():
-            manager.register_process(proc)
+            manager.register_process(proc, autostart=False)
+        manager.adopt_processes()
+        active = [name for name, proc in processes.items() if proc.active]
+        manager.start_processes(active, max_workers=max_workers or 1)
+        return manager
+
+    def _stream_into(self, manager, max_workers):
+        manager.groups = self.groups
+        errors = []
+        for name, spec in self.iter_specs():
+            for process in self.instantiate(name, spec, errors, manager.processes):
+                if process.name in manager.processes:
+                    errors.append(f"Process {process.name} is defined twice")
+                    continue
+                manager.register_process(process, autostart=False)
+                # Group dependencies are only known at the end of the file.
+                if errors or process.depends_on:
+                    continue
+                if not manager.adopt_processes([process.name]) and process.active:
+                    manager.start_concurrently([process.name], max_workers=1)
+
+        self._resolve_groups(manager.processes)
+        self._validate_dependencies(manager.processes, errors)
+        if errors:
+            # Nothing may keep running off an invalid configuration. Unlike
+            # stop_all, shutdown does not need a valid dependency graph.
+            manager.shutdown(detach=False)
+            raise ConfigError(errors, self.filepath)
+
+        self._probe_interpreters(manager.processes)
+        manager.adopt_processes()
+        pending = [
+            name
+            for name, proc in manager.processes.items()
+            if proc.active and proc.status == "not started"
+        ]
+        manager.start_processes(pending, max_workers=max_workers or 1)
         return manager
 
 
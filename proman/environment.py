@@ -1,12 +1,120 @@
+import json
+import logging
 import os
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from proman.paths import cache_dir
 
-def is_valid_python_interpreter(path):
+logger = logging.getLogger(__name__)
+
+
+class InterpreterCache:
+    """
+    Process-wide cache of interpreter probes.
+    Entries are keyed by path and only reused while the file keeps the same
+    mtime and inode and the probe is younger than ttl seconds. The cache can be
+    saved to disk so that warm restarts of proman skip the probes entirely.
+    """
+
+    def __init__(self, filepath=None, ttl=24 * 3600):
+        self.filepath = filepath or cache_dir() / "interpreters.json"
+        self.ttl = ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def python_version(self, path):
+        """Return the version string of a valid interpreter, None otherwise."""
+        key = _file_key(path)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._load().get(path)
+        if entry is not None and self._is_fresh(entry, key):
+            return entry["version"]
+
+        version = _probe_python_version(path)
+        with self._lock:
+            self._load()[path] = {
+                "mtime": key[0],
+                "inode": key[1],
+                "checked_at": time.time(),
+                "version": version,
+            }
+        return version
+
+    def probe(self, paths, max_workers=8):
+        """Probe many interpreters at once; only stale entries fork a child."""
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as pool:
+            return dict(zip(paths, pool.map(self.python_version, paths)))
+
+    def save(self):
+        with self._lock:
+            entries = self._evict(self._load())
+            try:
+                self.filepath.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.filepath.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(entries))
+                os.replace(tmp_path, self.filepath)
+            except OSError as e:
+                logger.warning(
+                    "Could not save the interpreter cache",
+                    extra={"path": str(self.filepath), "error": str(e)},
+                )
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    def _load(self):
+        # Called with the lock held.
+        if self._entries is None:
+            try:
+                self._entries = self._evict(json.loads(self.filepath.read_text()))
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _evict(self, entries):
+        now = time.time()
+        return {
+            path: entry
+            for path, entry in entries.items()
+            if now - entry.get("checked_at", 0) < self.ttl
+        }
+
+    def _is_fresh(self, entry, key):
+        return (entry["mtime"], entry["inode"]) == key and time.time() - entry[
+            "checked_at"
+        ] < self.ttl
+
+
+def _file_key(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
     if not os.path.isfile(path) or not os.access(path, os.X_OK):
-        return False
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def _probe_python_version(path):
     try:
         output = subprocess.check_output([path, "--version"], stderr=subprocess.STDOUT)
-        return output.decode().strip().startswith("Python")
     except Exception:
-        return False
+        return None
+    version = output.decode().strip()
+    return version if version.startswith("Python") else None
+
+
+interpreter_cache = InterpreterCache()
+
+
+def is_valid_python_interpreter(path):
+    return interpreter_cache.python_version(path) is not None
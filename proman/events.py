@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class Notifier:
+    """
+    Wakes up asyncio tasks waiting for something published from any thread.
+    Each waiter is woken up through its own event loop, so idle waiters cost
+    nothing.
+    """
+
+    def __init__(self):
+        self._waiters = set()
+        self._lock = threading.Lock()
+
+    def notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, predicate, timeout=None):
+        """Wait until predicate() holds, re-checking it on every notification."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while not predicate():
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+                waiter[1].clear()
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class EventLog:
+    """
+    Bounded log of process status and health changes, numbered by a sequence number so
+    that clients can resume from the last event they have seen.
+    Events are published from any thread; subscribers are asyncio tasks that
+    are woken up through their own event loop, so idle streams cost nothing.
+    """
+
+    def __init__(self, maxlen=1000):
+        self.seq = 0
+        self._events = deque(maxlen=maxlen)
+        self._notifier = Notifier()
+        self._lock = threading.Lock()
+
+    def publish(self, name, summary):
+        with self._lock:
+            self.seq += 1
+            self._events.append({"seq": self.seq, "name": name, "summary": summary})
+        self._notifier.notify()
+
+    def since(self, seq):
+        """
+        Return the events published after seq, or None when the log cannot
+        replay them anymore and the client has to start over from a snapshot.
+        """
+        with self._lock:
+            if seq > self.seq:
+                return None
+            if seq < self.seq and (
+                not self._events or self._events[0]["seq"] > seq + 1
+            ):
+                return None
+            return [event for event in self._events if event["seq"] > seq]
+
+    async def wait(self, seq, timeout=None):
+        """Wait until an event newer than seq is published or timeout expires."""
+        return await self._notifier.wait(lambda: self.seq > seq, timeout)
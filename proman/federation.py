@@ -0,0 +1,243 @@
+import http.client
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Errors of a keep-alive connection the peer closed while it was idle.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class PeerError(Exception):
+    """A request to a peer failed or timed out."""
+
+
+class Peer:
+    """
+    A remote proman instance. Requests reuse keep-alive connections, up to
+    max_connections idle ones are kept, and each request is bounded by
+    timeout seconds. The last status fetched from the peer is kept, with its
+    ETag so that a refresh of an unchanged peer costs a 304.
+    """
+
+    def __init__(self, name, url, timeout=2.0, max_connections=4):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        parts = urlsplit(self.url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid URL '{url}' for peer '{name}'")
+        self._connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self._address = (parts.hostname, parts.port)
+        self._idle = []
+        self._lock = threading.Lock()
+        # Last known state.
+        self.processes = None
+        self.etag = None
+        self.fetched_at = None
+        self.error = None
+        self.latency = None
+        self._refreshing = None
+
+    def request(self, method, path, body=None):
+        """
+        Send a request, return (status code, headers, parsed JSON body or
+        None). Raises PeerError when the peer cannot be reached.
+        """
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        return self._send(method, path, payload, headers)
+
+    def _send(self, method, path, payload, headers):
+        connection, reused = self._acquire()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except _STALE_CONNECTION_ERRORS as e:
+            connection.close()
+            if reused:
+                # Closed by the peer while idle: retry on a fresh connection.
+                return self._send(method, path, payload, headers)
+            raise PeerError(f"{self.name}: {e or type(e).__name__}") from e
+        except Exception as e:
+            connection.close()
+            raise PeerError(f"{self.name}: {e or type(e).__name__}") from e
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        parsed = None
+        if data and response.getheader("Content-Type", "").startswith(
+            "application/json"
+        ):
+            try:
+                parsed = json.loads(data)
+            except ValueError as e:
+                raise PeerError(f"{self.name}: invalid JSON response ({e})") from e
+        return response.status, response.headers, parsed
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        host, port = self._address
+        return self._connection_class(host, port, timeout=self.timeout), False
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.max_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def refresh(self):
+        """Fetch the status of the processes of the peer, if it changed."""
+        started = time.perf_counter()
+        try:
+            status, headers, body = self._send(
+                "GET",
+                "/api/status",
+                None,
+                {"If-None-Match": self.etag} if self.etag else {},
+            )
+        except PeerError as e:
+            self.set_error(str(e))
+            return
+        if status == 200 and not isinstance(body, dict):
+            self.set_error(f"{self.name}: unexpected status response")
+            return
+        if status == 200:
+            self.processes = body
+            self.etag = headers.get("ETag")
+        elif status != 304:
+            self.set_error(f"{self.name}: HTTP {status}")
+            return
+        self.fetched_at = time.time()
+        self.latency = time.perf_counter() - started
+        if self.error is not None:
+            logger.info("Peer reachable again", extra={"peer": self.name})
+        self.error = None
+
+    def set_error(self, error):
+        if self.error is None:
+            logger.warning(
+                "Peer unreachable", extra={"peer": self.name, "error": error}
+            )
+        self.error = error
+
+    def describe(self):
+        """The last known state of the peer."""
+        return {
+            "url": self.url,
+            "reachable": self.error is None and self.fetched_at is not None,
+            "error": self.error,
+            "fetched_at": self.fetched_at,
+            "latency_ms": (
+                round(self.latency * 1000, 1) if self.latency is not None else None
+            ),
+            "processes": self.processes,
+        }
+
+
+def parse_peer(spec, timeout=2.0):
+    """Build a Peer from a NAME=URL command line argument."""
+    name, separator, url = spec.partition("=")
+    if not separator or not name:
+        raise ValueError(f"Invalid peer '{spec}', expected NAME=URL")
+    return Peer(name, url, timeout=timeout)
+
+
+class Federation:
+    """
+    The remote proman peers aggregated by this instance. Requests to the
+    peers are fanned out concurrently on a thread pool, and every peer is
+    given at most its timeout: a slow or unreachable peer is reported with
+    its last known state and never holds up the others. Concurrent refreshes
+    of a peer share a single request.
+    """
+
+    def __init__(self, peers=(), max_workers=32):
+        self.peers = {}
+        for peer in peers:
+            if peer.name in self.peers:
+                raise ValueError(f"Duplicate peer '{peer.name}'")
+            self.peers[peer.name] = peer
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="proman-federation"
+        )
+        self._lock = threading.Lock()
+
+    def fan_out(self, call, names=None):
+        """
+        Run call(peer) for the named peers (all by default) concurrently.
+        Returns a dictionary mapping each peer name to the result of the call,
+        or to the PeerError it raised or timed out with.
+        """
+        names = list(self.peers) if names is None else names
+        return self._collect(
+            {name: self._pool.submit(call, self.peers[name]) for name in names}
+        )
+
+    def refresh(self, names=None):
+        """Refresh the status of the peers, waiting at most their timeouts."""
+        futures = {}
+        with self._lock:
+            for name in self.peers if names is None else names:
+                peer = self.peers[name]
+                if peer._refreshing is None or peer._refreshing.done():
+                    peer._refreshing = self._pool.submit(peer.refresh)
+                futures[name] = peer._refreshing
+        for name, result in self._collect(futures).items():
+            if isinstance(result, PeerError):
+                self.peers[name].set_error(str(result))
+
+    def _collect(self, futures):
+        # Every peer gets its own timeout, counted from the same start.
+        started = time.monotonic()
+        results = {}
+        for name, future in futures.items():
+            timeout = self.peers[name].timeout
+            try:
+                results[name] = future.result(
+                    timeout=max(0.0, started + timeout - time.monotonic())
+                )
+            except FutureTimeoutError:
+                results[name] = PeerError(f"{name}: no answer within {timeout:g}s")
+            except PeerError as e:
+                results[name] = e
+            except Exception as e:
+                # A bug or an odd answer of one peer must not fail the others.
+                logger.exception("Peer request failed", extra={"peer": name})
+                results[name] = PeerError(f"{name}: {e or type(e).__name__}")
+        return results
+
+    def status(self):
+        """Refresh the peers and return the last known state of each."""
+        self.refresh()
+        return {name: peer.describe() for name, peer in self.peers.items()}
+
+    def close(self):
+        for peer in self.peers.values():
+            peer.close()
+        self._pool.shutdown(wait=False)
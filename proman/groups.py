@@ -0,0 +1,62 @@
+import copy
+import re
+
+# Only these placeholders are rendered. Any other brace, a shell ${VARIABLE}
+# (even ${name}) or a JSON argument, is left untouched.
+_PLACEHOLDER = re.compile(r"(?<!\$)\{(index|name|group|port)\}")
+
+
+def _render(value, variables):
+    if isinstance(value, str):
+        return _PLACEHOLDER.sub(
+            lambda match: str(variables.get(match.group(1), match.group(0))), value
+        )
+    if isinstance(value, list):
+        return [_render(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _render(item, variables) for key, item in value.items()}
+    return value
+
+
+class ProcessGroup:
+    """
+    A process definition with replicas: N identical instances named
+    <name>-0 ... <name>-<N-1>. Every string of the configuration is rendered
+    per instance with {name}, {group}, {index} and, when
+    port_base is configured, {port} = port_base + index.
+    """
+
+    def __init__(self, name, cls, config):
+        self.name = name
+        self.cls = cls
+        self.template = {k: v for k, v in config.items() if k != "replicas"}
+        self.replicas = int(config.get("replicas", 1))
+        # Names of the processes depending on the group, whose depends_on
+        # lists its current replicas, even while it has none.
+        self.dependents = set()
+
+    def replica_name(self, index):
+        return f"{self.name}-{index}"
+
+    def replica_names(self):
+        return [self.replica_name(index) for index in range(self.replicas)]
+
+    def instantiate(self, index):
+        variables = dict(
+            name=self.replica_name(index),
+            group=self.name,
+            index=index,
+        )
+        if "port_base" in self.template:
+            variables["port"] = int(self.template["port_base"]) + index
+        config = _render(copy.deepcopy(self.template), variables)
+        config["name"] = self.replica_name(index)
+
+        instance = self.cls()
+        instance._initialize(config)
+        instance.name = self.replica_name(index)
+        instance.group = self.name
+        instance.replica_index = index
+        if self.name not in instance.tags:
+            instance.tags.append(self.name)
+        return instance
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Literal, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# None for processes without a health check.
+HealthStatus = Optional[Literal["unknown", "healthy", "unhealthy"]]
+
+
+class HealthCheck:
+    """
+    Declarative health check of a process: an HTTP GET (http: url, healthy on
+    a 2xx or 3xx response), a TCP connect (tcp: port or host:port) or a shell
+    command (command: ..., healthy on exit code 0). The process turns
+    unhealthy after failure_threshold consecutive failures, not counting the
+    failures within start_period seconds of its start.
+    """
+
+    def __init__(self, config):
+        self.http = config.get("http")
+        self.tcp = config.get("tcp")
+        self.command = config.get("command")
+        self.interval = float(config.get("interval", 10))
+        self.timeout = float(config.get("timeout", 2))
+        self.failure_threshold = int(config.get("failure_threshold", 3))
+        self.start_period = float(config.get("start_period", 0))
+        # Fraction of the interval by which every probe is randomly shifted.
+        self.jitter = float(config.get("jitter", 0.1))
+        self.restart = bool(config.get("restart", False))
+        self.last_error = None
+
+        kinds = [kind for kind in ("http", "tcp", "command") if config.get(kind)]
+        if len(kinds) != 1:
+            raise ValueError(
+                "A healthcheck needs exactly one of 'http', 'tcp' or 'command'"
+            )
+        if self.http:
+            url = urlsplit(str(self.http))
+            if url.scheme not in ("http", "https") or not url.hostname:
+                raise ValueError(
+                    f"Invalid healthcheck URL '{self.http}', expected http(s)://host"
+                )
+        if self.tcp:
+            _, _, port = str(self.tcp).rpartition(":")
+            if not port.isdigit() or not 0 < int(port) < 65536:
+                raise ValueError(
+                    f"Invalid healthcheck address '{self.tcp}', expected a port "
+                    "or host:port"
+                )
+
+    async def probe(self):
+        """Run the check once, return whether it passed."""
+        try:
+            if self.http:
+                healthy = await asyncio.wait_for(self._probe_http(), self.timeout)
+            elif self.tcp:
+                healthy = await asyncio.wait_for(self._probe_tcp(), self.timeout)
+            else:
+                healthy = await self._probe_command()
+        except asyncio.TimeoutError:
+            self.last_error = f"timed out after {self.timeout:g}s"
+            return False
+        except OSError as e:
+            self.last_error = str(e)
+            return False
+        if healthy:
+            self.last_error = None
+        return healthy
+
+    async def _probe_http(self):
+        url = urlsplit(self.http)
+        https = url.scheme == "https"
+        reader, writer = await asyncio.open_connection(
+            url.hostname or "localhost",
+            url.port or (443 if https else 80),
+            ssl=True if https else None,
+        )
+        try:
+            target = (url.path or "/") + (f"?{url.query}" if url.query else "")
+            writer.write(
+                f"GET {target} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+                f"User-Agent: proman\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[1].isdigit():
+            self.last_error = "invalid HTTP response"
+            return False
+        if not 200 <= int(parts[1]) < 400:
+            self.last_error = f"HTTP {int(parts[1])}"
+            return False
+        return True
+
+    async def _probe_tcp(self):
+        host, _, port = str(self.tcp).rpartition(":")
+        _, writer = await asyncio.open_connection(host or "localhost", int(port))
+        writer.close()
+        return True
+
+    async def _probe_command(self):
+        child = await asyncio.create_subprocess_shell(
+            self.command,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            returncode = await asyncio.wait_for(child.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            child.kill()
+            await child.wait()
+            raise
+        if returncode != 0:
+            self.last_error = f"exit code {returncode}"
+        return returncode == 0
+
+
+class HealthMonitor:
+    """
+    Runs the health checks of all processes as tasks of a single asyncio
+    event loop, in its own thread. The first probe of every check is delayed
+    by a random fraction of its interval, and every interval is jittered, so
+    that checks configured alike do not all fire at once.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._loop = None
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def watch(self, process):
+        if process.healthcheck is None:
+            return
+        loop = self._ensure_loop()
+        loop.call_soon_threadsafe(self._create_task, process)
+
+    def unwatch(self, name):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_task, name)
+
+    def close(self):
+        """Cancel every check and stop the event loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(self._close, loop)
+
+    def _close(self, loop):
+        for name in list(self._tasks):
+            self._cancel_task(name)
+        # Scheduled after the cancellations, so that the tasks see them first.
+        loop.call_soon(loop.stop)
+
+    async def _probe(self, process):
+        check = process.healthcheck
+        try:
+            return await check.probe()
+        except Exception as e:
+            # Counted as a failure, the check must keep running.
+            logger.exception(
+                "Health check failed unexpectedly",
+                extra={"process_name": process.name},
+            )
+            check.last_error = str(e) or type(e).__name__
+            return False
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="proman-health", daemon=True
+                ).start()
+            return self._loop
+
+    def _create_task(self, process):
+        self._cancel_task(process.name)
+        self._tasks[process.name] = self._loop.create_task(self._run(process))
+
+    def _cancel_task(self, name):
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    async def _run(self, process):
+        check = process.healthcheck
+        await asyncio.sleep(random.uniform(0, check.interval))
+        failures = 0
+        last_error = None
+        while True:
+            if process.status != "running":
+                failures = 0
+                process.health = "unknown"
+            elif await self._probe(process):
+                failures = 0
+                process.health = "healthy"
+            else:
+                started_at = process.started_at or 0
+                if time.time() - started_at >= check.start_period:
+                    failures += 1
+                if failures >= check.failure_threshold:
+                    failures = 0
+                    process.health = "unhealthy"
+                    if check.restart:
+                        logger.warning(
+                            "Process is unhealthy, restarting it",
+                            extra={
+                                "process_name": process.name,
+                                "error": check.last_error,
+                            },
+                        )
+                        await self._loop.run_in_executor(
+                            None, self.manager._restart_unhealthy, process
+                        )
+            if check.last_error != last_error:
+                # Served in the status snapshot as health_error.
+                last_error = check.last_error
+                self.manager.snapshot.invalidate(process.name)
+            await asyncio.sleep(
+                check.interval * random.uniform(1 - check.jitter, 1 + check.jitter)
+            )
@@ -0,0 +1,76 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """A control operation running in the background, e.g. starting a process."""
+
+    def __init__(self, action, target):
+        self.id = uuid.uuid4().hex
+        self.action = action
+        self.target = target
+        self.state = "pending"
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "action": self.action,
+            "target": self.target,
+            "state": self.state,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobRunner:
+    """
+    Runs control operations on a bounded thread pool and keeps the most recent
+    max_history jobs around so that their outcome can be queried by id.
+    """
+
+    def __init__(self, max_workers=8, max_history=1000):
+        self.max_history = max_history
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="proman-job"
+        )
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, action, target, fn):
+        """Schedule fn(job) and return the job immediately."""
+        job = Job(action, target)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_history:
+                self._jobs.popitem(last=False)
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn):
+        job.state = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job)
+            job.state = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.state = "failed"
+        finally:
+            job.finished_at = time.time()
@@ -0,0 +1,129 @@
+import glob
+import os
+import platform
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+RLIMITS = {
+    "memory": "RLIMIT_AS",
+    "open_files": "RLIMIT_NOFILE",
+    "processes": "RLIMIT_NPROC",
+    "cpu_time": "RLIMIT_CPU",
+    "file_size": "RLIMIT_FSIZE",
+    "core": "RLIMIT_CORE",
+}
+
+IONICE_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+# ioprio_set has no wrapper in the standard library.
+_IOPRIO_SET_SYSCALLS = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+
+
+def parse_cpu_list(value):
+    """Parse a cpu list such as [0, 1], "0-3,8" or 5 into a sorted list of cpus."""
+    if isinstance(value, int):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return sorted(int(cpu) for cpu in value)
+    cpus = set()
+    for part in str(value).split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        elif part:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def numa_nodes():
+    """Return the cpus usable by proman, grouped by NUMA node."""
+    allowed = set(os.sched_getaffinity(0))
+    nodes = []
+    for cpulist in sorted(glob.glob("/sys/devices/system/node/node*/cpulist")):
+        with open(cpulist) as cpulist_file:
+            cpus = [
+                cpu for cpu in parse_cpu_list(cpulist_file.read()) if cpu in allowed
+            ]
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [sorted(allowed)]
+
+
+def spread_cpu(index):
+    """
+    Pick the core of the index-th replica so that replicas are spread evenly:
+    round-robin over the NUMA nodes first, then over the cores of each node.
+    """
+    nodes = numa_nodes()
+    node = nodes[index % len(nodes)]
+    return [node[(index // len(nodes)) % len(node)]]
+
+
+class ResourceLimits:
+    """
+    CPU affinity, nice level, I/O priority and rlimits of a process, applied to
+    its child by pid right after the spawn. Until then, for a few hundred
+    microseconds, the child runs without them, and whatever it forks in that
+    time inherits the limits of proman. cpu_affinity: auto pins each replica
+    of a group to its own core, spread across NUMA nodes.
+    """
+
+    def __init__(self, config):
+        self.cpu_affinity = config.get("cpu_affinity")
+        self.nice = config.get("nice")
+        self.ionice = config.get("ionice")
+        self.rlimits = dict(config.get("rlimits", {}))
+
+        if isinstance(self.ionice, str):
+            self.ionice = {"class": self.ionice}
+        if self.ionice is not None and self.ionice.get("class") not in IONICE_CLASSES:
+            raise ValueError(
+                f"Invalid ionice class {self.ionice.get('class')!r}, "
+                f"expected one of {list(IONICE_CLASSES)}"
+            )
+        for name in self.rlimits:
+            if name not in RLIMITS:
+                raise ValueError(
+                    f"Unknown rlimit '{name}', expected one of {list(RLIMITS)}"
+                )
+
+    def __bool__(self):
+        return any(
+            value is not None and value != {}
+            for value in (self.cpu_affinity, self.nice, self.ionice, self.rlimits)
+        )
+
+    def apply(self, pid, replica_index=None):
+        """Apply the limits to a running process."""
+        if self.cpu_affinity == "auto":
+            if replica_index is not None:
+                os.sched_setaffinity(pid, spread_cpu(replica_index))
+        elif self.cpu_affinity is not None:
+            os.sched_setaffinity(pid, parse_cpu_list(self.cpu_affinity))
+        if self.nice is not None:
+            os.setpriority(os.PRIO_PROCESS, pid, int(self.nice))
+        if self.ionice is not None:
+            _ioprio_set(
+                pid,
+                IONICE_CLASSES[self.ionice["class"]],
+                int(self.ionice.get("level", 4)),
+            )
+        for name, value in self.rlimits.items():
+            limit = getattr(resource, RLIMITS[name])
+            resource.prlimit(pid, limit, (int(value), int(value)))
+
+
+def _ioprio_set(pid, ioprio_class, level):
+    import ctypes
+
+    syscall_number = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if syscall_number is None:
+        raise OSError(f"ionice is not supported on {platform.machine()}")
+    syscall = ctypes.CDLL(None, use_errno=True).syscall
+    # ioprio_set(IOPRIO_WHO_PROCESS, pid, class << 13 | level)
+    if syscall(syscall_number, 1, pid, (ioprio_class << 13) | level) != 0:
+        raise OSError(ctypes.get_errno(), "ioprio_set failed")
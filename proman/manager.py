@@ -1,45 +1,606 @@
-from proman.processes import Process
+import fnmatch
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from proman.capture import OutputCollector
+from proman.events import EventLog
+from proman.health import HealthMonitor
+from proman.metrics import MetricsSampler
+from proman.processes import Process, TaskProcess
+from proman.prometheus import PrometheusMetrics
+from proman.scheduler import dependency_levels, is_ready, wait_ready
+from proman.shutdown import terminate
+from proman.snapshot import StatusSnapshot
+from proman.state import AdoptedProcess, proc_start_time
+from proman.supervisor import Supervisor
+from proman.tasks import TaskPool
+
+logger = logging.getLogger(__name__)
 
 
 class ProcessManager:
-    def __init__(self):
+    def __init__(self, log_dir=None, state=None, max_tasks=4):
         self.processes = {}
+        self.groups = {}
+        self.state = state
+        self.output = OutputCollector(log_dir)
+        self.supervisor = Supervisor(on_exit=self._on_process_exit)
+        self.events = EventLog()
+        self.metrics = MetricsSampler(self)
+        self.health = HealthMonitor(self)
+        self.prometheus = PrometheusMetrics(self)
+        self.snapshot = StatusSnapshot(self)
+        self.tasks = TaskPool(self, max_workers=max_tasks)
+        # Serializes reloads and scaling, which both add and remove processes.
+        self._topology_lock = threading.RLock()
 
-    def register_process(self, process: Process):
+    def register_process(self, process: Process, autostart=True):
         self.processes[process.name] = process
-        if process.active:
+        process.on_status_change = self._publish_status
+        self.prometheus.register(process.name)
+        self.snapshot.invalidate(process.name)
+        if process.output is None:
+            process.output = self.output.buffer(
+                process.name, max_bytes=process.log_buffer_bytes
+            )
+        self.events.publish(process.name, process.summary())
+        self.health.watch(process)
+        if autostart and process.active:
+            self._start(process)
+        logger.info("Process added", extra={"process_name": process.name})
+
+    def unregister_process(self, name):
+        process = self.processes.pop(name, None)
+        if process is not None:
+            if isinstance(process, TaskProcess):
+                self.tasks.cancel(process)
+            self.metrics.series.pop(name, None)
+            self.health.unwatch(name)
+            self.prometheus.unregister(name)
+            self.snapshot.invalidate(name)
+            # A None status tells event subscribers that the process is gone.
+            self.events.publish(name, None)
+            logger.info("Process removed", extra={"process_name": name})
+        return process
+
+    def reload(self, processes, max_workers=1, groups=None):
+        """
+        Apply a freshly parsed configuration: processes that were removed or
+        whose configuration changed are stopped, new and changed processes are
+        registered and started if active. Unchanged processes keep running
+        untouched.
+        Returns the names of the added, removed and changed processes.
+        """
+        with self._topology_lock:
+            return self._reload(processes, max_workers, groups)
+
+    def _reload(self, processes, max_workers, groups):
+        if groups is not None:
+            self.groups = groups
+        added = [name for name in processes if name not in self.processes]
+        removed = [name for name in self.processes if name not in processes]
+        changed = [
+            name
+            for name, process in processes.items()
+            if name in self.processes
+            and process.config_hash() != self.processes[name].config_hash()
+        ]
+
+        self.stop_processes(removed + changed)
+        for name in removed:
+            self.unregister_process(name)
+        for name in changed:
+            # Keep the captured output of the previous incarnation.
+            processes[name].output = self.unregister_process(name).output
+        for name in added + changed:
+            self.register_process(processes[name], autostart=False)
+        self.start_processes(
+            [name for name in added + changed if processes[name].active],
+            max_workers=max_workers,
+        )
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def scale(self, name, replicas, max_workers=8):
+        """
+        Change the number of replicas of a process group, starting or stopping
+        only the difference. Returns the names of the added and removed replicas.
+        """
+        with self._topology_lock:
+            return self._scale(name, replicas, max_workers)
+
+    def _scale(self, name, replicas, max_workers):
+        group = self.groups[name]
+        current, group.replicas = group.replicas, replicas
+        added = []
+        for index in range(current, replicas):
+            replica = group.instantiate(index)
+            self.register_process(replica, autostart=False)
+            added.append(replica.name)
+        removed = [group.replica_name(index) for index in range(replicas, current)]
+        # Dependents of the group depend on exactly its current replicas.
+        previous = set(group.replica_name(index) for index in range(current))
+        for dependent in group.dependents:
+            process = self.processes.get(dependent)
+            if process is not None:
+                process.depends_on = [
+                    dependency
+                    for dependency in process.depends_on
+                    if dependency not in previous
+                ] + group.replica_names()
+        self.stop_processes(removed, max_workers=max_workers)
+        for replica_name in removed:
+            self.unregister_process(replica_name)
+        self.start_processes(
+            [n for n in added if self.processes[n].active], max_workers=max_workers
+        )
+        return {"added": added, "removed": removed}
+
+    def _start(self, process):
+        if isinstance(process, TaskProcess):
+            # Tasks run on the task pool, their children are not supervised.
+            self.tasks.start(process)
+            return
+        with process._lock:
+            started = time.perf_counter()
             process._start()
-        print(f"Process '{process.name}' added.")
+            self.prometheus.observe_start(process, time.perf_counter() - started)
+            self.snapshot.invalidate(process.name)
+            if process.status == "running":
+                self.supervisor.watch(process)
+                self._record_state(process)
+
+    def _record_state(self, process):
+        popen = getattr(process, "process", None)
+        if self.state is None or popen is None:
+            return
+        # A child writing into a pipe to proman would not survive it: it is
+        # stopped on shutdown instead, and not re-adopted.
+        if getattr(popen, "stdout", None) is not None:
+            return
+        start_time = proc_start_time(popen.pid)
+        if start_time is None:
+            return
+        self.state.set(
+            process.name,
+            {
+                "pid": popen.pid,
+                "start_time": start_time,
+                "started_at": process.started_at,
+                "config_hash": process.config_hash(),
+            },
+        )
+
+    def adopt_processes(self, names=None):
+        """
+        Re-adopt the children recorded in the state store by a previous proman
+        instance, instead of spawning duplicates. A child is only adopted when
+        its pid still runs with the recorded start time and the configuration
+        of its process did not change. names restricts adoption to some
+        processes.
+        """
+        if self.state is None:
+            return []
+        adopted = []
+        for name in self.state.names():
+            if names is not None and name not in names:
+                continue
+            entry = self.state.get(name)
+            process = self.processes.get(name)
+            if (
+                process is None
+                or process.status == "running"
+                or entry["config_hash"] != process.config_hash()
+                or proc_start_time(entry["pid"]) != entry["start_time"]
+            ):
+                self.state.discard(name)
+                continue
+            with process._lock:
+                process.process = AdoptedProcess(entry["pid"], entry["start_time"])
+                process.process_group = _led_group(entry["pid"])
+                process.started_at = entry["started_at"]
+                process.status = "running"
+                self.supervisor.watch(process)
+            logger.info(
+                "Process adopted", extra={"process_name": name, "pid": entry["pid"]}
+            )
+            adopted.append(name)
+        return adopted
+
+    def _stop(self, process):
+        if isinstance(process, TaskProcess):
+            self.tasks.cancel(process)
+            self.prometheus.observe_stop(process)
+            return
+        with process._lock:
+            self._cancel_restart(process)
+            process._stop()
+            self.prometheus.observe_stop(process)
+            self.snapshot.invalidate(process.name)
+
+    def _on_process_exit(self, process, returncode):
+        """Apply the restart policy of a process whose child exited on its own."""
+        self.snapshot.invalidate(process.name)
+        if not process._stopping:
+            self.prometheus.observe_exit(process)
+        if process._stopping or not process.restart_policy.should_restart(returncode):
+            return
+        uptime = None
+        if process.started_at is not None:
+            uptime = process.stopped_at - process.started_at
+        self._schedule_restart(process, uptime)
+
+    def _schedule_restart(self, process, uptime):
+        """
+        Restart process after the backoff delay of its restart policy, or mark
+        it as failed when it is crash looping.
+        """
+        delay = process.restart_policy.next_delay(uptime)
+        if delay is None:
+            process.status = "failed"
+            logger.error(
+                "Process is crash looping, giving up",
+                extra={
+                    "process_name": process.name,
+                    "max_restarts": process.restart_policy.max_restarts,
+                    "window": process.restart_policy.window,
+                },
+            )
+            return
+
+        process.status = "restarting"
+        logger.info(
+            "Process will be restarted",
+            extra={"process_name": process.name, "delay": round(delay, 3)},
+        )
+        process._restart_timer = threading.Timer(delay, self._restart, args=(process,))
+        process._restart_timer.daemon = True
+        process._restart_timer.start()
+
+    def _restart(self, process):
+        with process._lock:
+            process._restart_timer = None
+            # Manual starts and stops during the backoff take precedence.
+            if process.status != "restarting":
+                return
+            process.restart_count += 1
+            self._start(process)
+            if process.status == "failed":
+                # The spawn itself failed, so no exit will be reported for it.
+                self._on_process_exit(process, None)
+
+    def _restart_unhealthy(self, process):
+        with process._lock:
+            # The process may have been stopped or restarted in the meantime.
+            if process.status != "running" or process.health != "unhealthy":
+                return
+            uptime = process.uptime()
+            self._stop(process)
+            if process.status != "error":
+                # Backoff and crash loop detection apply as to exits.
+                self._schedule_restart(process, uptime)
+
+    def _cancel_restart(self, process):
+        timer, process._restart_timer = process._restart_timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def _manual_start(self, process):
+        if isinstance(process, TaskProcess):
+            self.tasks.start(process, run_now=True)
+            return
+        with process._lock:
+            # A manual start gives the process a fresh restart budget.
+            self._cancel_restart(process)
+            process.restart_policy.reset()
+            self._start(process)
 
     def start_process(self, name):
         process = self.processes.get(name)
         if process:
-            process._start()
+            self._manual_start(process)
+        else:
+            logger.warning("No such process", extra={"process_name": name})
+
+    def restart_process(self, name):
+        process = self.processes.get(name)
+        if process:
+            with process._lock:
+                if process.status in ("running", "restarting"):
+                    self._stop(process)
+                self._manual_start(process)
         else:
-            print(f"No process named '{name}' found.")
+            logger.warning("No such process", extra={"process_name": name})
 
     def stop_process(self, name):
         process = self.processes.get(name)
         if process:
-            process._stop()
+            self._stop(process)
         else:
-            print(f"No process named '{name}' found.")
+            logger.warning("No such process", extra={"process_name": name})
 
     def describe_process(self, name):
         process = self.processes.get(name)
         if process:
             return process._describe()
         else:
-            print(f"No process named '{name}' found.")
+            logger.warning("No such process", extra={"process_name": name})
             return {}
 
+    def _publish_status(self, process, status):
+        if self.processes.get(process.name) is process:
+            self.snapshot.invalidate(process.name)
+            self.events.publish(process.name, process.summary())
+            if self.state is not None and status != "running":
+                self.state.discard(process.name)
+
+    def status_snapshot(self):
+        """
+        Return the current event sequence number and the summary of every process.
+        The sequence number is read first, so replaying the events published
+        after it on top of the snapshot never misses a change.
+        """
+        seq = self.events.seq
+        return seq, {name: proc.summary() for name, proc in self.processes.items()}
+
+    def health_report(self):
+        """
+        Aggregated health of the active processes with a health check: healthy
+        only when all of them are healthy.
+        """
+        checked = {
+            name: process.health
+            for name, process in self.processes.items()
+            if process.healthcheck is not None and process.active
+        }
+        healthy = all(health == "healthy" for health in checked.values())
+        return {"healthy": healthy, "processes": checked}
+
     def list_processes(self):
         return list(self.processes.keys())
 
-    def start_all(self):
-        for process in self.processes.values():
-            process._start()
+    def select(self, names=None, tag=None, pattern=None):
+        """
+        Return the names of the processes matching any of the selectors: an
+        explicit list of names, a tag, or a glob pattern on the process name.
+        Explicit names are returned even when no such process exists.
+        """
+        selected = dict.fromkeys(names or [])
+        for name, process in self.processes.items():
+            if (tag is not None and tag in process.tags) or (
+                pattern is not None and fnmatch.fnmatchcase(name, pattern)
+            ):
+                selected[name] = None
+        return list(selected)
 
-    def stop_all(self):
-        for process in self.processes.values():
-            process._stop()
+    def bulk(self, action, names, parallelism=8, batch_size=None, on_result=None):
+        """
+        Start, stop or restart many processes at once, with at most parallelism
+        operations in flight. With batch_size, the processes are handled in
+        rolling batches: every process of a batch has to become ready before the
+        next batch begins, and the rollout halts after the first failing batch.
+        Returns a dictionary mapping each name to its result; on_result is also
+        called with every (name, result) pair as soon as it is known.
+        """
+        if action not in ("start", "stop", "restart"):
+            raise ValueError(f"Unsupported bulk action: {action}")
+        control = getattr(self, f"{action}_process")
+
+        def run(name):
+            process = self.processes.get(name)
+            if process is None:
+                return name, {"result": "not found"}
+            if action == "stop":
+                if process.status in ("running", "restarting"):
+                    control(name)
+                ok = process.status != "error"
+            else:
+                control(name)
+                ok = wait_ready(process)
+            return name, {"result": "ok" if ok else "failed", "status": process.status}
+
+        def report(name, result):
+            results[name] = result
+            if on_result is not None:
+                on_result(name, result)
+
+        results = {}
+        if not names:
+            return results
+        batch_size = batch_size or len(names)
+        batches = [names[i : i + batch_size] for i in range(0, len(names), batch_size)]
+        for index, batch in enumerate(batches):
+            with ThreadPoolExecutor(max_workers=min(parallelism, len(batch))) as pool:
+                for name, result in pool.map(run, batch):
+                    report(name, result)
+            if any(results[name]["result"] != "ok" for name in batch):
+                for name in itertools.chain.from_iterable(batches[index + 1 :]):
+                    report(name, {"result": "skipped"})
+                break
+        return results
+
+    def start_all(self, max_workers=1):
+        self.start_processes(list(self.processes), max_workers=max_workers)
+
+    def stop_all(self, max_workers=8):
+        self.stop_processes(list(self.processes), max_workers=max_workers)
+
+    def shutdown(self, grace=None, detach=True):
+        """
+        Stop every process as proman exits. Unlike stop_all, dependency order
+        is not honoured: SIGTERM goes to all the process groups at once and
+        they are waited for together, then the stragglers are killed, so that
+        shutting down takes the longest stop_timeout (or grace) rather than
+        their sum. Processes whose class overrides stop() are stopped through
+        it, concurrently.
+        With a state store and detach, the children recorded in the store are
+        left running and keep their entries, so that the next proman re-adopts
+        them: restarting proman does not restart them.
+        """
+        self.health.close()
+        self.metrics.stop()
+        self.tasks.close()
+        stopping = []
+        detached = []
+        for process in list(self.processes.values()):
+            with process._lock:
+                self._cancel_restart(process)
+                if process.status not in ("running", "restarting"):
+                    continue
+                if (
+                    detach
+                    and self.state is not None
+                    and self.state.get(process.name) is not None
+                ):
+                    detached.append(process)
+                else:
+                    process._stopping = True
+                    stopping.append(process)
+        if self.state is not None:
+            for process in stopping:
+                self.state.discard(process.name)
+            self.state.flush()
+        if detached:
+            logger.info(
+                "Leaving processes running for the next proman",
+                extra={"processes": [process.name for process in detached]},
+            )
+        if not stopping:
+            return
+
+        logger.info("Shutting down", extra={"processes": len(stopping)})
+        started = time.perf_counter()
+        grouped = [p for p in stopping if type(p).stop is Process.stop]
+        custom = [p for p in stopping if type(p).stop is not Process.stop]
+        with ThreadPoolExecutor(max_workers=max(len(custom), 1)) as pool:
+            for process in custom:
+                pool.submit(self._stop, process)
+            killed = terminate(grouped, grace)
+            for process in grouped:
+                with process._lock:
+                    process.status = "stopped"
+                    process.stopped_at = time.time()
+                    self.prometheus.observe_stop(process)
+                    self.snapshot.invalidate(process.name)
+
+        for process in killed:
+            logger.warning(
+                "Process did not stop in time, killed",
+                extra={"process_name": process.name},
+            )
+        logger.info(
+            "Shut down",
+            extra={
+                "processes": len(stopping),
+                "killed": len(killed),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            },
+        )
+
+    def start_processes(self, names, max_workers=1):
+        """
+        Start the named processes level by level along their dependency graph.
+        Each level is started concurrently and has to pass its readiness checks
+        before the next level begins. Processes whose dependencies did not become
+        ready are skipped.
+        Returns a dictionary mapping each started process to its spawn latency.
+        """
+        latencies = {}
+        not_ready = set()
+        depended_on = {d for name in names for d in self.processes[name].depends_on}
+        for level in dependency_levels(self.processes, names):
+            runnable = []
+            for name in level:
+                blocking = [
+                    dependency
+                    for dependency in self.processes[name].depends_on
+                    if dependency in not_ready
+                    # Started earlier, e.g. a task that already ran.
+                    or (
+                        dependency not in latencies
+                        and not is_ready(self.processes[dependency])
+                    )
+                ]
+                if blocking:
+                    logger.warning(
+                        "Process skipped, dependencies not ready",
+                        extra={"process_name": name, "dependencies": blocking},
+                    )
+                    not_ready.add(name)
+                else:
+                    runnable.append(name)
+            if not runnable:
+                continue
+
+            latencies.update(self.start_concurrently(runnable, max_workers))
+            # Tasks no process depends on are not waited for.
+            awaited = [
+                name
+                for name in runnable
+                if name in depended_on
+                or not isinstance(self.processes[name], TaskProcess)
+            ]
+            if not awaited:
+                continue
+            with ThreadPoolExecutor(max_workers=len(awaited)) as pool:
+                readiness = pool.map(lambda n: wait_ready(self.processes[n]), awaited)
+                for name, ready in zip(awaited, readiness):
+                    if not ready:
+                        logger.warning(
+                            "Process did not become ready",
+                            extra={"process_name": name},
+                        )
+                        not_ready.add(name)
+        return latencies
+
+    def stop_processes(self, names, max_workers=8):
+        """
+        Stop the named processes in reverse dependency order, so that no process
+        is stopped before its dependents. Each level is stopped concurrently.
+        """
+        for level in reversed(dependency_levels(self.processes, names)):
+            running = [
+                n
+                for n in level
+                if self.processes[n].status in ("running", "restarting")
+                # Idle tasks may still have a schedule to disarm.
+                or isinstance(self.processes[n], TaskProcess)
+            ]
+            if not running:
+                continue
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(lambda n: self._stop(self.processes[n]), running))
+
+    def start_concurrently(self, names, max_workers=8):
+        """
+        Start the named processes on a bounded thread pool, so that at most
+        max_workers spawns are in flight at once.
+        Returns a dictionary mapping each process name to its spawn latency
+        in seconds.
+        """
+
+        def timed_start(name):
+            started_at = time.perf_counter()
+            self._start(self.processes[name])
+            return name, time.perf_counter() - started_at
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            latencies = dict(pool.map(timed_start, names))
+
+        for name, latency in sorted(latencies.items(), key=lambda kv: -kv[1]):
+            logger.info(
+                "Process spawned",
+                extra={"process_name": name, "latency_ms": round(latency * 1000, 1)},
+            )
+        return latencies
+
+
+def _led_group(pid):
+    # The process group of an adopted child, if it leads its own.
+    try:
+        return pid if os.getpgid(pid) == pid else None
+    except (AttributeError, OSError):
+        return None
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from array import array
+
+METRIC_FIELDS = ("timestamp", "cpu_percent", "rss_bytes", "threads", "open_fds")
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class RingBuffer:
+    """Fixed-size time series, stored as one preallocated array per field."""
+
+    def __init__(self, capacity, fields=METRIC_FIELDS):
+        self.capacity = capacity
+        self.fields = fields
+        self._columns = {field: array("d", bytes(8 * capacity)) for field in fields}
+        self._next = 0
+        self._size = 0
+
+    def append(self, sample):
+        for field in self.fields:
+            self._columns[field][self._next] = sample[field]
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def latest(self):
+        if not self._size:
+            return None
+        index = (self._next - 1) % self.capacity
+        return {field: self._columns[field][index] for field in self.fields}
+
+    def to_dict(self):
+        """Return every field as a list ordered from the oldest to the newest sample."""
+        start = (self._next - self._size) % self.capacity
+        series = {}
+        for field, column in self._columns.items():
+            if start + self._size <= self.capacity:
+                series[field] = column[start : start + self._size].tolist()
+            else:
+                series[field] = column[start:].tolist() + column[: self._next].tolist()
+        return series
+
+
+def read_proc_table():
+    """
+    Read /proc/<pid>/stat of every process in one pass.
+    Returns a dictionary mapping each pid to (ppid, cpu_ticks, threads, rss_bytes).
+    """
+    table = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, the fields start after its ')'.
+        fields = stat[stat.rfind(b")") + 2 :].split()
+        table[int(entry.name)] = (
+            int(fields[1]),
+            int(fields[11]) + int(fields[12]),
+            int(fields[17]),
+            int(fields[21]) * _PAGE_SIZE,
+        )
+    return table
+
+
+def _count_open_fds(pid):
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return 0
+
+
+class MetricsSampler:
+    """
+    Periodically samples CPU, RSS, thread count and open file descriptors of
+    every running process, including all of its descendants (e.g. the
+    commands spawned by a ShellProcess shell), straight from /proc.
+    Each process gets a RingBuffer holding its last capacity samples.
+    """
+
+    def __init__(self, manager, interval=5.0, capacity=720):
+        self.manager = manager
+        self.interval = interval
+        self.capacity = capacity
+        self.series = {}
+        self._cpu_ticks = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def is_supported():
+        return os.path.isdir("/proc/self")
+
+    def start(self):
+        if self._thread is not None or not self.is_supported():
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="proman-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def latest(self, name):
+        series = self.series.get(name)
+        return series.latest() if series is not None else None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        now = time.monotonic()
+        table = read_proc_table()
+        children = {}
+        for pid, (ppid, *_) in table.items():
+            children.setdefault(ppid, []).append(pid)
+
+        for name, process in list(self.manager.processes.items()):
+            popen = getattr(process, "process", None)
+            if process.status != "running" or popen is None or popen.pid not in table:
+                self._cpu_ticks.pop(name, None)
+                continue
+
+            pids = [popen.pid]
+            for pid in pids:
+                pids.extend(children.get(pid, ()))
+            cpu_ticks = sum(table[pid][1] for pid in pids)
+
+            cpu_percent = 0.0
+            previous = self._cpu_ticks.get(name)
+            if previous is not None and now > previous[1]:
+                elapsed_ticks = (now - previous[1]) * _CLOCK_TICKS
+                cpu_percent = max(0, cpu_ticks - previous[0]) / elapsed_ticks * 100
+            self._cpu_ticks[name] = (cpu_ticks, now)
+
+            if name not in self.series:
+                self.series[name] = RingBuffer(self.capacity)
+            self.series[name].append(
+                {
+                    "timestamp": time.time(),
+                    "cpu_percent": cpu_percent,
+                    "rss_bytes": sum(table[pid][3] for pid in pids),
+                    "threads": sum(table[pid][2] for pid in pids),
+                    "open_fds": sum(_count_open_fds(pid) for pid in pids),
+                }
+            )
@@ -1,5 +1,11 @@
+import os
 from pathlib import Path
 
 
 def toabs(base, relpath):
     return (Path(base).parent / relpath).resolve()
+
+
+def cache_dir():
+    """Directory where proman persists caches between runs."""
+    return Path(os.environ.get("PROMAN_CACHE_DIR", Path.home() / ".cache" / "proman"))
@@ -1,8 +1,27 @@
+import hashlib
+import json
+import logging
+import os
 import subprocess
 import sys
+import threading
+import time
+from collections import deque
 from typing import Literal
 
 from proman.environment import is_valid_python_interpreter
+from proman.health import HealthCheck, HealthStatus
+from proman.limits import ResourceLimits
+from proman.restart import RestartPolicy
+from proman.shutdown import SIGKILL, terminate
+from proman.tasks import parse_schedule
+from proman.zygote import Zygote, get_zygote
+
+logger = logging.getLogger(__name__)
+
+ProcessStatus = Literal[
+    "not started", "queued", "running", "restarting", "stopped", "failed", "error"
+]
 
 # ------------------------------------------------------------------------------
 # Base Process class with automatic subclass registration
@@ -11,6 +30,11 @@ from proman.environment import is_valid_python_interpreter
 
 class Process:
     registry = {}
+    # Called with (process, status) whenever the status or health of a process
+    # changes.
+    on_status_change = None
+    # LogBuffer receiving the captured output of the process, if any.
+    output = None
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
@@ -26,44 +50,197 @@ class Process:
         Initialize the process with configuration data.
         Subclasses must override this method.
         """
-        self.status: Literal["not started", "running", "stopped", "failed", "error"] = (
-            "not started"
-        )
+        self.config = config
+        self.status = "not started"
         self.active = bool(config.get("active", True))
+        self.depends_on = list(config.get("depends_on", []))
+        self.tags = list(config.get("tags", []))
+        # Name and index of the ProcessGroup replica this process is, if any.
+        self.group = None
+        self.replica_index = None
+        self.limits = ResourceLimits(config)
+        self.readiness = dict(config.get("readiness", {}))
+        self.healthcheck = None
+        if "healthcheck" in config:
+            self.healthcheck = HealthCheck(config["healthcheck"])
+        self.health = "unknown" if self.healthcheck is not None else None
+        self.capture_output = bool(config.get("capture_output", True))
+        self.log_buffer_bytes = int(config.get("log_buffer_bytes", 1 << 20))
+        self.output_offset = 0
+        self.restart_policy = RestartPolicy(config)
+        self.restart_count = 0
+        self._restart_timer = None
+        self.exit_code = None
+        self.started_at = None
+        self.stopped_at = None
+        self._stopping = False
+        # Seconds between SIGTERM and SIGKILL when the process is stopped.
+        self.stop_timeout = float(config.get("stop_timeout", 5))
+        # Process group led by the child, signalled as a whole on stop.
+        self.process_group = None
+        # Serializes control operations (start, stop, restart) on this process.
+        self._lock = threading.RLock()
         self.initialize(config)
 
+    def config_hash(self):
+        """Fingerprint of the process class and configuration, to detect changes."""
+        payload = json.dumps(
+            [type(self).__name__, self.config], sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @property
+    def status(self) -> ProcessStatus:
+        return self._status
+
+    @status.setter
+    def status(self, value: ProcessStatus):
+        previous = getattr(self, "_status", None)
+        self._status = value
+        if value != previous and self.on_status_change is not None:
+            self.on_status_change(self, value)
+
+    @property
+    def health(self) -> HealthStatus:
+        return self._health
+
+    @health.setter
+    def health(self, value: HealthStatus):
+        previous = getattr(self, "_health", None)
+        self._health = value
+        if value != previous and self.on_status_change is not None:
+            self.on_status_change(self, self.status)
+
+    def summary(self):
+        """The status entry of the process served by /api/status."""
+        return {"status": self.status, "health": self.health}
+
     def _start(self):
         if self.status == "running":
-            print(f"Process '{self.name}' is already running.")
+            logger.info("Process already running", extra={"process_name": self.name})
             return
 
         self.status = "running"
+        self._stopping = False
+        if self.healthcheck is not None:
+            self.health = "unknown"
 
         try:
             self.start()
-            print(f"Process '{self.name}' started with PID {self.process.pid}.")
+            self.exit_code = None
+            self.started_at = time.time()
+            logger.info(
+                "Process started",
+                extra={"process_name": self.name, "pid": self.process.pid},
+            )
         except Exception as e:
-            print(f"nProcess '{self.name}' encountered an error: {e}")
+            logger.error(
+                "Process failed to start",
+                extra={"process_name": self.name, "error": str(e)},
+            )
             self.status = "failed"
 
     def _stop(self):
-        if self.status != "running":
-            print(f"Process '{self.name}' is not running, cannot stop.")
+        if self.status not in ("running", "restarting"):
+            logger.warning(
+                "Process is not running, cannot stop",
+                extra={"process_name": self.name},
+            )
+            return
 
+        self._stopping = True
         try:
             self.stop()
-            print(f"Process '{self.name}' terminated.")
+            self.stopped_at = time.time()
+            logger.info("Process terminated", extra={"process_name": self.name})
         except Exception as e:
-            print(f"Process '{self.name}' failed to terminate: {e}")
+            logger.error(
+                "Process failed to terminate",
+                extra={"process_name": self.name, "error": str(e)},
+            )
             self.status = "error"
 
+    def _on_exit(self, returncode):
+        """Called by the supervisor as soon as the child process has exited."""
+        self.exit_code = returncode
+        self.stopped_at = time.time()
+        if self._stopping or self.status != "running":
+            return
+        self.status = "stopped" if returncode == 0 else "failed"
+        logger.log(
+            logging.INFO if returncode == 0 else logging.WARNING,
+            "Process exited",
+            extra={"process_name": self.name, "exit_code": returncode},
+        )
+
+    def uptime(self):
+        if self.status != "running" or self.started_at is None:
+            return None
+        return time.time() - self.started_at
+
     def _describe(self):
-        base_info = {"name": self.name, "status": self.status}
+        base_info = {
+            "name": self.name,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "uptime": self.uptime(),
+            "restart": self.restart_policy.mode,
+            "restarts": self.restart_count,
+            "health": self.health,
+        }
+        if self.healthcheck is not None and self.healthcheck.last_error:
+            base_info["health_error"] = self.healthcheck.last_error
         info = self.describe()
         base_info.update(info)
-        print(f"Describing {base_info}")
+        logger.debug("Process described", extra={"description": base_info})
         return base_info
 
+    def spawn(self, cmd, **kwargs):
+        """
+        Start a child with subprocess.Popen, applying the options proman
+        manages for every process, such as output capture and resource limits.
+        Subclasses should spawn their children through this method rather than
+        calling Popen directly.
+        """
+        capture = self.capture_output and self.output is not None
+        if capture:
+            kwargs.setdefault("stdout", subprocess.PIPE)
+            kwargs.setdefault("stderr", subprocess.STDOUT)
+        if hasattr(os, "killpg"):
+            # Its own process group, so that stop() reaches its descendants too.
+            kwargs.setdefault("start_new_session", True)
+        popen = subprocess.Popen(cmd, **kwargs)
+        self.process_group = popen.pid if kwargs.get("start_new_session") else None
+        if self.limits:
+            self._apply_limits(popen)
+        if capture and popen.stdout is not None:
+            self._attach_output(popen.stdout)
+        return popen
+
+    def _apply_limits(self, popen):
+        # Applied by pid once the child runs: a preexec_fn is not safe in
+        # proman's threaded parent. A child whose limits cannot be applied is
+        # killed, and the start fails.
+        try:
+            self.limits.apply(popen.pid, self.replica_index)
+        except Exception:
+            # self.process is still the previous child: kill the new one.
+            try:
+                if self.process_group == popen.pid:
+                    os.killpg(popen.pid, SIGKILL)
+                else:
+                    popen.kill()
+            except ProcessLookupError:
+                pass
+            popen.wait()
+            if popen.stdout is not None:
+                popen.stdout.close()
+            raise
+
+    def _attach_output(self, pipe):
+        self.output_offset = self.output.total
+        self.output.attach(pipe)
+
     def initialize(self, config):
         raise NotImplementedError("Subclasses must implement initialize()")
 
@@ -71,7 +248,12 @@ class Process:
         raise NotImplementedError("Subclasses must implement start()")
 
     def stop(self):
-        raise NotImplementedError("Subclasses must implement stop()")
+        """
+        Send SIGTERM to the process group of the child, and SIGKILL if it is
+        still alive after stop_timeout seconds.
+        """
+        terminate([self])
+        self.status = "stopped"
 
     def describe(self):
         """Return info specific to the process"""
@@ -90,6 +272,9 @@ class PythonProcess(Process):
         self.target = None
         self.args = []
         self.kwargs = {}
+        self.interpreter_path = None
+        self.spawn_mode = "process"
+        self.preload = []
         self.process = None
 
     def initialize(self, config):
@@ -98,30 +283,69 @@ class PythonProcess(Process):
         self.target = config.get("target")
         self.args = config.get("args", [])
         self.kwargs = config.get("kwargs", {})
+        self.interpreter_path = self.kwargs.get("interpreter_path")
+        self.spawn_mode = config.get("spawn_mode", "process")
+        self.preload = list(config.get("preload", []))
+        if self.spawn_mode not in ("process", "zygote"):
+            raise ValueError(
+                f"Invalid spawn_mode '{self.spawn_mode}', expected process or zygote"
+            )
 
     def _get_interpreter_path(self):
-        if "interpreter_path" in self.kwargs:
-            interpreter_path = self.kwargs.get("interpreter_path")
-            if is_valid_python_interpreter(interpreter_path):
-                return interpreter_path
+        if self.interpreter_path is not None:
+            if is_valid_python_interpreter(self.interpreter_path):
+                return self.interpreter_path
 
         return sys.executable
 
     def start(self):
 
         executable = self._get_interpreter_path()
+        popen_kwargs = {k: v for k, v in self.kwargs.items() if k != "interpreter_path"}
+        if self.spawn_mode == "zygote" and Zygote.is_supported():
+            self.process = self._spawn_from_zygote(executable, popen_kwargs)
+            return
         cmd = [executable, self.target] + [str(arg) for arg in self.args]
-        self.process = subprocess.Popen(cmd, **self.kwargs)
-
-    def stop(self):
-        self.process.terminate()
-        self.process.wait(timeout=5)
-        self.status = "stopped"
+        self.process = self.spawn(cmd, **popen_kwargs)
+
+    def _spawn_from_zygote(self, executable, popen_kwargs):
+        # The counterpart of spawn() for children forked by a warm zygote.
+        unsupported = set(popen_kwargs) - {"cwd", "env"}
+        if unsupported:
+            raise ValueError(
+                f"spawn_mode zygote does not support {sorted(unsupported)}"
+            )
+        zygote = get_zygote(executable, self.preload)
+        capture = self.capture_output and self.output is not None
+        read_fd, write_fd = os.pipe() if capture else (None, None)
+        try:
+            child = zygote.spawn(
+                [self.target] + [str(arg) for arg in self.args],
+                cwd=popen_kwargs.get("cwd"),
+                env=popen_kwargs.get("env"),
+                stdout=write_fd,
+                new_session=True,
+            )
+        except Exception:
+            if capture:
+                os.close(read_fd)
+            raise
+        finally:
+            if capture:
+                os.close(write_fd)
+        if capture:
+            child.stdout = open(read_fd, "rb", buffering=0)
+            self._attach_output(child.stdout)
+        self.process_group = child.pid
+        if self.limits:
+            self._apply_limits(child)
+        return child
 
     def describe(self):
         info = {
             "target": self.target,
             "args": self.args,
+            "spawn_mode": self.spawn_mode,
         }
         info.update(self.kwargs)
         return info
@@ -139,18 +363,59 @@ class ShellProcess(Process):
         self.command = None
 
     def initialize(self, config):
-        super().initialize(config)
         self.name = config.get("name")
         self.command = config.get("command")
 
     def start(self):
-        self.process = subprocess.Popen(self.command, shell=True)
+        self.process = self.spawn(self.command, shell=True)
         self.status = "running"
 
-    def stop(self):
-        self.process.terminate()
-        self.process.wait()
-        self.status = "stopped"
-
     def __repr__(self):
         return f"<ShellProcess name={self.name}, command={self.command}, status={self.status}>"
+
+
+class TaskProcess(Process):
+    """
+    A short job rather than a service: its shell command runs to completion on
+    the task worker pool of the manager, once when started or on a schedule.
+    Failed runs are retried, and the latest runs are kept in a bounded
+    history. Processes depending on a task wait for a successful run.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.command = None
+        self.process = None
+
+    def initialize(self, config):
+        self.name = config.get("name")
+        self.command = config.get("command")
+        if not self.command:
+            raise ValueError("A TaskProcess needs a 'command'")
+        self.schedule = parse_schedule(config.get("schedule"))
+        self.retries = int(config.get("retries", 0))
+        self.retry_delay = float(config.get("retry_delay", 1))
+        timeout = config.get("timeout")
+        self.timeout = float(timeout) if timeout is not None else None
+        self.history = deque(maxlen=int(config.get("history", 100)))
+        self.next_run = None
+        self._schedule_timer = None
+        if not self.readiness:
+            self.readiness = {"exit_code": 0, "timeout": 3600}
+
+    def start(self):
+        self.process = self.spawn(self.command, shell=True)
+
+    def describe(self):
+        info = {
+            "command": self.command,
+            "schedule": str(self.schedule) if self.schedule is not None else None,
+            "next_run": self.next_run,
+            "retries": self.retries,
+        }
+        if self.history:
+            info["last_run"] = self.history[-1]
+        return info
+
+    def __repr__(self):
+        return f"<TaskProcess name={self.name}, command={self.command}, status={self.status}>"
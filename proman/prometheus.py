@@ -0,0 +1,235 @@
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, in the Prometheus sense."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class ProcessSeries:
+    """Counters of one process, allocated once when the process is registered."""
+
+    __slots__ = ("labels", "starts", "failed_starts", "stops", "exits", "start_latency")
+
+    def __init__(self, name):
+        self.labels = _labels(process=name)
+        self.starts = 0
+        self.failed_starts = 0
+        self.stops = 0
+        self.exits = 0
+        self.start_latency = Histogram()
+
+
+class PrometheusMetrics:
+    """
+    Metrics exported at /metrics in the Prometheus text format. Counters are
+    updated where the events happen (starts, stops, exits, API requests), and
+    gauges are read from the process state and the latest MetricsSampler
+    sample, so a scrape only formats values and never computes them.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.series = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def register(self, name):
+        self.series[name] = ProcessSeries(name)
+
+    def unregister(self, name):
+        self.series.pop(name, None)
+
+    def observe_start(self, process, seconds):
+        series = self.series.get(process.name)
+        if series is None:
+            return
+        if process.status == "running":
+            series.starts += 1
+            series.start_latency.observe(seconds)
+        else:
+            series.failed_starts += 1
+
+    def observe_stop(self, process):
+        series = self.series.get(process.name)
+        if series is not None:
+            series.stops += 1
+
+    def observe_exit(self, process):
+        series = self.series.get(process.name)
+        if series is not None:
+            series.exits += 1
+
+    def observe_request(self, method, route, seconds):
+        key = (method, route)
+        histogram = self.requests.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.requests.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def render(self):
+        processes = [
+            (process, self.series.get(name), self.manager.metrics.latest(name))
+            for name, process in list(self.manager.processes.items())
+        ]
+        processes = [entry for entry in processes if entry[1] is not None]
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{{{labels}}} {value}")
+
+        family(
+            "proman_process_up",
+            "gauge",
+            "Whether the process is running.",
+            ((s.labels, int(p.status == "running")) for p, s, _ in processes),
+        )
+        family(
+            "proman_process_healthy",
+            "gauge",
+            "Whether the health check of the process passes.",
+            (
+                (s.labels, int(p.health == "healthy"))
+                for p, s, _ in processes
+                if p.health is not None
+            ),
+        )
+        family(
+            "proman_process_starts_total",
+            "counter",
+            "Successful starts of the process.",
+            ((s.labels, s.starts) for _, s, _ in processes),
+        )
+        family(
+            "proman_process_failed_starts_total",
+            "counter",
+            "Starts of the process that failed to spawn it.",
+            ((s.labels, s.failed_starts) for _, s, _ in processes),
+        )
+        family(
+            "proman_process_stops_total",
+            "counter",
+            "Stops of the process requested through proman.",
+            ((s.labels, s.stops) for _, s, _ in processes),
+        )
+        family(
+            "proman_process_exits_total",
+            "counter",
+            "Exits of the process not requested through proman.",
+            ((s.labels, s.exits) for _, s, _ in processes),
+        )
+        family(
+            "proman_process_restarts_total",
+            "counter",
+            "Automatic restarts of the process.",
+            ((s.labels, p.restart_count) for p, s, _ in processes),
+        )
+        family(
+            "proman_process_last_exit_code",
+            "gauge",
+            "Exit code of the last run of the process.",
+            ((s.labels, p.exit_code) for p, s, _ in processes),
+        )
+        family(
+            "proman_process_start_time_seconds",
+            "gauge",
+            "Unix time at which the process was last started.",
+            ((s.labels, p.started_at) for p, s, _ in processes),
+        )
+        family(
+            "proman_process_cpu_percent",
+            "gauge",
+            "CPU usage of the process and its descendants, latest sample.",
+            ((s.labels, m["cpu_percent"]) for _, s, m in processes if m),
+        )
+        family(
+            "proman_process_resident_memory_bytes",
+            "gauge",
+            "Resident memory of the process and its descendants, latest sample.",
+            ((s.labels, int(m["rss_bytes"])) for _, s, m in processes if m),
+        )
+
+        name = "proman_process_start_duration_seconds"
+        lines.append(f"# HELP {name} Time taken to spawn the process.")
+        lines.append(f"# TYPE {name} histogram")
+        for _, series, _ in processes:
+            lines.extend(series.start_latency.render(name, series.labels))
+
+        name = "proman_http_request_duration_seconds"
+        lines.append(f"# HELP {name} Latency of the API until the response starts.")
+        lines.append(f"# TYPE {name} histogram")
+        for (method, route), histogram in list(self.requests.items()):
+            lines.extend(histogram.render(name, _labels(method=method, route=route)))
+        return "\n".join(lines) + "\n"
+
+
+class RequestLatencyMiddleware:
+    """
+    ASGI middleware recording the latency of every API request, up to the
+    start of its response (streams like /api/events stay open for long).
+    Requests are labelled by route template rather than path, so the number of
+    series stays bounded.
+    """
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_and_observe(message):
+            if message["type"] == "http.response.start":
+                route = getattr(scope.get("route"), "path", "other")
+                self.metrics.observe_request(
+                    scope["method"], route, time.perf_counter() - started
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_and_observe)
@@ -0,0 +1,62 @@
+import random
+import time
+from collections import deque
+
+RESTART_MODES = ("always", "on-failure", "never")
+
+
+class RestartPolicy:
+    """
+    Decides whether and when an exited process is restarted.
+    Delays grow exponentially from backoff.initial by backoff.multiplier up to
+    backoff.max seconds, randomized by +/- backoff.jitter (a fraction of the
+    delay). More than crash_loop.max_restarts restarts within
+    crash_loop.window seconds is treated as a crash loop.
+    """
+
+    def __init__(self, config):
+        self.mode = config.get("restart", "never")
+        if self.mode not in RESTART_MODES:
+            raise ValueError(
+                f"Invalid restart mode '{self.mode}', expected one of {RESTART_MODES}"
+            )
+        backoff = config.get("backoff", {})
+        self.initial_delay = float(backoff.get("initial", 1))
+        self.multiplier = float(backoff.get("multiplier", 2))
+        self.max_delay = float(backoff.get("max", 60))
+        self.jitter = float(backoff.get("jitter", 0.1))
+        crash_loop = config.get("crash_loop", {})
+        self.max_restarts = int(crash_loop.get("max_restarts", 5))
+        self.window = float(crash_loop.get("window", 60))
+
+        self.attempt = 0
+        self._restarts = deque()
+
+    def should_restart(self, returncode):
+        if self.mode == "always":
+            return True
+        return self.mode == "on-failure" and returncode != 0
+
+    def next_delay(self, uptime=None):
+        """
+        Register a restart and return the delay to wait before it, or None when
+        the process is crash looping and must not be restarted.
+        """
+        now = time.monotonic()
+        # A child that stayed up for a whole window starts over from the
+        # initial delay.
+        if uptime is not None and uptime >= self.window:
+            self.attempt = 0
+        while self._restarts and now - self._restarts[0] > self.window:
+            self._restarts.popleft()
+        if len(self._restarts) >= self.max_restarts:
+            return None
+        self._restarts.append(now)
+
+        delay = min(self.initial_delay * self.multiplier**self.attempt, self.max_delay)
+        self.attempt += 1
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def reset(self):
+        self.attempt = 0
+        self._restarts.clear()
@@ -0,0 +1,105 @@
+import socket
+import time
+
+from proman.processes import TaskProcess
+
+
+def dependency_levels(processes, names=None):
+    """
+    Group process names into topological levels along their depends_on edges:
+    every process only depends on processes from earlier levels.
+    Dependencies on processes outside of names are ignored.
+    Raises ValueError on unknown dependencies and on dependency cycles.
+    """
+    names = list(processes) if names is None else list(names)
+    selected = set(names)
+    pending = {}
+    for name in names:
+        for dependency in processes[name].depends_on:
+            if dependency not in processes:
+                raise ValueError(
+                    f"Process '{name}' depends on unknown process '{dependency}'"
+                )
+        pending[name] = {d for d in processes[name].depends_on if d in selected}
+
+    levels = []
+    while pending:
+        level = [name for name, dependencies in pending.items() if not dependencies]
+        if not level:
+            raise ValueError(
+                f"Dependency cycle between processes: {', '.join(pending)}"
+            )
+        for name in level:
+            del pending[name]
+        for dependencies in pending.values():
+            dependencies.difference_update(level)
+        levels.append(level)
+    return levels
+
+
+def wait_ready(process, poll_interval=0.1):
+    """
+    Block until the readiness condition of the process holds or its timeout
+    expires. Supported conditions are an open TCP port (port, host), a line
+    printed to the captured output (log_line) and an expected exit code
+    (exit_code). Processes without a readiness condition
+    are ready as soon as they are running.
+    """
+    readiness = process.readiness
+    if not readiness:
+        return process.status == "running"
+
+    deadline = time.monotonic() + float(readiness.get("timeout", 30))
+    while True:
+        ready = _check_readiness(process, readiness)
+        if ready is not None:
+            return ready
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
+
+def is_ready(process):
+    """Whether the readiness condition of the process holds now, without waiting."""
+    return _check_readiness(process, process.readiness or {}) is True
+
+
+def _check_readiness(process, readiness):
+    """Return True/False once readiness is decided, None while still pending."""
+    if isinstance(process, TaskProcess) and "exit_code" in readiness:
+        # Decided by the last run, once its retries are exhausted.
+        if process.status in ("queued", "running", "restarting"):
+            return None
+        return process.exit_code == readiness["exit_code"]
+
+    if "exit_code" in readiness:
+        popen = getattr(process, "process", None)
+        if popen is not None and popen.poll() is not None:
+            return popen.returncode == readiness["exit_code"]
+
+    if process.status in ("failed", "error"):
+        return False
+
+    if "exit_code" in readiness:
+        return None
+
+    if process.status != "running":
+        return False
+
+    if "log_line" in readiness:
+        output = process.output
+        if output is None or not output.contains(
+            readiness["log_line"], process.output_offset
+        ):
+            return None
+        return True
+
+    if "port" in readiness:
+        address = (readiness.get("host", "localhost"), int(readiness["port"]))
+        try:
+            socket.create_connection(address, timeout=1).close()
+            return True
+        except OSError:
+            return None
+
+    return True
@@ -1,20 +1,82 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
 import webbrowser
+from typing import List, Optional
+from urllib.parse import quote
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, Field
 
 from proman.config import ConfigParser
+from proman.federation import Federation, PeerError
+from proman.jobs import JobRunner
 from proman.paths import toabs
+from proman.prometheus import RequestLatencyMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class BulkRequest(BaseModel):
+    names: List[str] = []
+    tag: Optional[str] = None
+    pattern: Optional[str] = None
+    parallelism: int = Field(8, ge=1)
+    batch_size: Optional[int] = Field(None, ge=1)
+
+
+class FederatedBulkRequest(BulkRequest):
+    # Names of the nodes to run the action on, all of them by default.
+    nodes: Optional[List[str]] = None
 
 
 class ProcessManagerWebInterface:
-    def __init__(self, config_filepath: str, headless=False):
+    def __init__(
+        self,
+        config_filepath: str,
+        headless=False,
+        max_workers=None,
+        log_dir=None,
+        state_file=None,
+        streaming=False,
+        max_tasks=4,
+        peers=None,
+        node_name=None,
+    ):
         self.config_filepath = config_filepath
+        self.streaming = streaming
+        self.max_tasks = max_tasks
+        self.max_workers = max_workers
+        self.log_dir = log_dir
+        self.state_file = state_file
         self.app = FastAPI()
+        self.jobs = JobRunner()
+        self._reload_lock = threading.Lock()
+        self.node_name = node_name or socket.gethostname()
+        self.federation = Federation(peers or [])
+        if self.node_name in self.federation.peers:
+            raise ValueError(f"Peer '{self.node_name}' has the name of this node")
         self._setup_manager()
+        # uvicorn turns SIGINT and SIGTERM into a shutdown of the application,
+        # which stops all the processes at once, but the ones recorded in the
+        # state store, left running for the next proman to re-adopt.
+        self.app.router.add_event_handler("shutdown", lambda: self.manager.shutdown())
+        self.app.router.add_event_handler("shutdown", self.federation.close)
 
         self.headless = headless
 
@@ -31,7 +93,56 @@ class ProcessManagerWebInterface:
     def _setup_manager(self):
         # Initialize the ProcessManager using the YAML configuration.
         config_parser = ConfigParser(self.config_filepath)
-        self.manager = config_parser.init_process_manager()
+        self.manager = config_parser.init_process_manager(
+            self.max_workers,
+            self.log_dir,
+            self.state_file,
+            self.streaming,
+            self.max_tasks,
+        )
+        self.manager.metrics.start()
+
+    def reload(self):
+        """
+        Re-parse the configuration file and apply the differences to the running
+        manager. An invalid configuration raises before anything is touched.
+        """
+        with self._reload_lock:
+            config_parser = ConfigParser(self.config_filepath)
+            processes = config_parser.parse()
+            changes = self.manager.reload(
+                processes,
+                max_workers=self.max_workers or 1,
+                groups=config_parser.groups,
+            )
+        logger.info("Configuration reloaded", extra={"changes": changes})
+        return changes
+
+    def submit_reload(self):
+        return self.jobs.submit(
+            "reload", self.config_filepath, lambda job: self.reload()
+        )
+
+    def watch_config(self, interval=2.0):
+        """Reload the configuration whenever the file changes on disk."""
+
+        def signature():
+            try:
+                stat = os.stat(self.config_filepath)
+            except OSError:
+                return None
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+        def watch():
+            last = signature()
+            while True:
+                time.sleep(interval)
+                current = signature()
+                if current is not None and current != last:
+                    last = current
+                    self.submit_reload()
+
+        threading.Thread(target=watch, name="proman-config-watch", daemon=True).start()
 
     def _setup_routes(self):
         # Enable CORS to allow requests from any origin.
@@ -42,103 +153,149 @@ class ProcessManagerWebInterface:
             allow_methods=["*"],
             allow_headers=["*"],
         )
+        self.app.add_middleware(
+            RequestLatencyMiddleware, metrics=self.manager.prometheus
+        )
 
         @self.app.get("/api/status")
-        def get_status():
-            return {name: proc.status for name, proc in self.manager.processes.items()}
+        def get_status(
+            request: Request,
+            fields: Optional[str] = None,
+            offset: int = Query(0, ge=0),
+            limit: Optional[int] = Query(None, ge=1),
+        ):
+            fields = fields.split(",") if fields else None
+            # Unchanged since the client's copy: answer without rendering anything.
+            etag = self.manager.snapshot.etag(
+                self.manager.snapshot.version, fields, offset, limit
+            )
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+            version, total, body = self.manager.snapshot.render(fields, offset, limit)
+            return Response(
+                body,
+                media_type="application/json",
+                headers={
+                    "ETag": self.manager.snapshot.etag(version, fields, offset, limit),
+                    "Cache-Control": "no-cache",
+                    "X-Total-Count": str(total),
+                },
+            )
 
-        @self.app.post("/api/start/{process_name}")
-        def start_process(process_name: str):
-            if process_name not in self.manager.processes:
+        @self.app.get("/api/health")
+        def get_health():
+            report = self.manager.health_report()
+            return JSONResponse(report, status_code=200 if report["healthy"] else 503)
+
+        @self.app.get("/metrics")
+        def prometheus_metrics():
+            return Response(
+                self.manager.prometheus.render(),
+                media_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+
+        @self.app.get("/api/events")
+        async def stream_events(request: Request, since: Optional[int] = None):
+            # EventSource clients resume through the Last-Event-ID header.
+            last_event_id = request.headers.get("last-event-id")
+            if since is None and last_event_id and last_event_id.isdigit():
+                since = int(last_event_id)
+            return StreamingResponse(
+                self._event_stream(request, since),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        @self.app.post("/api/start/{process_name}", status_code=202)
+        async def start_process(process_name: str):
+            return self._control("start", process_name)
+
+        @self.app.post("/api/stop/{process_name}", status_code=202)
+        async def stop_process(process_name: str):
+            return self._control("stop", process_name)
+
+        @self.app.post("/api/bulk/{action}", status_code=202)
+        async def bulk_action(action: str, request: BulkRequest):
+            return self._bulk(action, request)
+
+        @self.app.post("/api/reload", status_code=202)
+        async def reload_config():
+            job = self.submit_reload()
+            return {"result": "Configuration reload queued.", "job": job.id}
+
+        @self.app.post("/api/scale/{group_name}", status_code=202)
+        async def scale_group(group_name: str, replicas: int):
+            if group_name not in self.manager.groups:
+                raise HTTPException(
+                    status_code=404, detail=f"Process group '{group_name}' not found"
+                )
+            if replicas < 0:
+                raise HTTPException(
+                    status_code=422, detail="The number of replicas cannot be negative"
+                )
+            job = self.jobs.submit(
+                "scale",
+                group_name,
+                lambda job: self.manager.scale(group_name, replicas),
+            )
+            return {"result": f"Scaling '{group_name}' to {replicas}.", "job": job.id}
+
+        @self.app.get("/api/jobs/{job_id}")
+        async def job_status(job_id: str):
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+            return job.to_dict()
+
+        @self.app.get("/api/info/{process_name}")
+        def process_info(process_name: str):
+            entry = self.manager.snapshot.entry(process_name)
+            if entry is None:
                 raise HTTPException(
                     status_code=404, detail=f"Process '{process_name}' not found"
                 )
-            self.manager.start_process(process_name)
-            return {"result": f"Process '{process_name}' started."}
+            info = {"name": process_name, **entry}
+            info["uptime"] = self.manager.processes[process_name].uptime()
+            info.update(self.manager.metrics.latest(process_name) or {})
+            return info
 
-        @self.app.post("/api/stop/{process_name}")
-        def stop_process(process_name: str):
-            if process_name not in self.manager.processes:
+        @self.app.get("/api/logs/{process_name}")
+        async def process_logs(
+            process_name: str, lines: Optional[int] = 100, follow: bool = False
+        ):
+            process = self.manager.processes.get(process_name)
+            if process is None or process.output is None:
                 raise HTTPException(
                     status_code=404, detail=f"Process '{process_name}' not found"
                 )
-            self.manager.stop_process(process_name)
-            return {"result": f"Process '{process_name}' stopped."}
-
-            html_content = """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <title>Process Manager Dashboard</title>
-                <script src="https://cdn.tailwindcss.com"></script>
-            </head>
-            <body class="bg-gray-100">
-                <div class="container mx-auto p-4">
-                    <h1 class="text-3xl font-bold text-center mb-6">Process Manager Dashboard</h1>
-                    <div id="status" class="overflow-x-auto"></div>
-                </div>
-                <script>
-                    async function fetchStatus() {
-                        const response = await fetch("/api/status");
-                        const status = await response.json();
-                        let html = `
-                        <table class="min-w-full bg-white shadow-md rounded-lg">
-                            <thead>
-                                <tr>
-                                    <th class="py-2 px-4 border-b">Process</th>
-                                    <th class="py-2 px-4 border-b">Status</th>
-                                    <th class="py-2 px-4 border-b">Actions</th>
-                                </tr>
-                            </thead>
-                            <tbody>`;
-                        for (let key in status) {
-                            const stat = status[key];
-                            const statusColor = stat === "running" ? "text-green-600" :
-                                                  stat === "stopped" ? "text-gray-600" :
-                                                  stat === "failed" ? "text-red-600" : "text-yellow-600";
-                            html += `
-                                <tr class="hover:bg-gray-100">
-                                    <td class="py-2 px-4 border-b">${key}</td>
-                                    <td class="py-2 px-4 border-b ${statusColor}">${stat}</td>
-                                    <td class="py-2 px-4 border-b">
-                                        <button onclick="startProcess('${key}')" class="bg-green-500 hover:bg-green-600 text-white py-1 px-2 rounded mr-2">Start</button>
-                                        <button onclick="stopProcess('${key}')" class="bg-red-500 hover:bg-red-600 text-white py-1 px-2 rounded">Stop</button>
-                                    </td>
-                                </tr>`;
-                        }
-                        html += `
-                            </tbody>
-                        </table>`;
-                        document.getElementById("status").innerHTML = html;
-                    }
-                    
-                    async function startProcess(name) {
-                        await fetch(`/api/start/${name}`, {method: "POST"});
-                        fetchStatus();
-                    }
-                    
-                    async function stopProcess(name) {
-                        await fetch(`/api/stop/${name}`, {method: "POST"});
-                        fetchStatus();
-                    }
-                    
-                    // Poll every 2 seconds for updates.
-                    setInterval(fetchStatus, 2000);
-                    fetchStatus();
-                </script>
-            </body>
-            </html>
-            """
-            return html_content
+            if not follow:
+                data, _ = process.output.tail(lines)
+                return Response(data, media_type="text/plain; charset=utf-8")
+            return StreamingResponse(
+                self._follow_output(process.output, lines),
+                media_type="text/plain; charset=utf-8",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
 
-        @self.app.get("/api/info/{process_name}")
-        def process_info(process_name: str):
+        @self.app.get("/api/history/{process_name}")
+        def task_history(process_name: str):
+            process = self.manager.processes.get(process_name)
+            if process is None or not hasattr(process, "history"):
+                raise HTTPException(
+                    status_code=404, detail=f"Task '{process_name}' not found"
+                )
+            return list(process.history)
+
+        @self.app.get("/api/metrics/{process_name}")
+        def process_metrics(process_name: str):
             if process_name not in self.manager.processes:
                 raise HTTPException(
                     status_code=404, detail=f"Process '{process_name}' not found"
                 )
-            return self.manager.describe_process(process_name)
+            series = self.manager.metrics.series.get(process_name)
+            return series.to_dict() if series is not None else {}
+
+        self._setup_federation_routes()
 
         if not self.headless:
 
@@ -147,15 +304,194 @@ class ProcessManagerWebInterface:
                 index_file = toabs(__file__, "./frontend/index.html")
                 return FileResponse(index_file)
 
+    def _setup_federation_routes(self):
+        @self.app.get("/api/federation/status")
+        def federation_status():
+            # Peers are refreshed concurrently, each for at most its timeout,
+            # and those that did not answer report their last known state.
+            _, _, body = self.manager.snapshot.render()
+            local = {
+                "url": None,
+                "reachable": True,
+                "error": None,
+                "fetched_at": time.time(),
+                "latency_ms": 0.0,
+                "processes": json.loads(body),
+            }
+            return {
+                "node": self.node_name,
+                "nodes": {self.node_name: local, **self.federation.status()},
+            }
+
+        @self.app.post("/api/federation/{node}/{action}/{process_name}")
+        def federation_control(node: str, action: str, process_name: str):
+            if action not in ("start", "stop"):
+                raise HTTPException(
+                    status_code=404, detail=f"Unsupported action '{action}'"
+                )
+            if node == self.node_name:
+                return JSONResponse(self._control(action, process_name), 202)
+            if node not in self.federation.peers:
+                raise HTTPException(status_code=404, detail=f"Node '{node}' not found")
+            path = f"/api/{action}/{quote(process_name, safe='')}"
+            result = self.federation.fan_out(
+                lambda peer: peer.request("POST", path), [node]
+            )[node]
+            if isinstance(result, PeerError):
+                raise HTTPException(status_code=502, detail=str(result))
+            status_code, _, body = result
+            return JSONResponse(body, status_code)
+
+        @self.app.post("/api/federation/bulk/{action}")
+        def federation_bulk(action: str, request: FederatedBulkRequest):
+            nodes = request.nodes
+            if nodes is None:
+                nodes = [self.node_name, *self.federation.peers]
+            unknown = set(nodes) - {self.node_name, *self.federation.peers}
+            if unknown:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Nodes not found: {', '.join(sorted(unknown))}",
+                )
+            body = _model_dict(request, exclude={"nodes"})
+            peers = [node for node in nodes if node != self.node_name]
+            results = self.federation.fan_out(
+                lambda peer: peer.request("POST", f"/api/bulk/{action}", body), peers
+            )
+            if self.node_name in nodes:
+                try:
+                    results[self.node_name] = (202, None, self._bulk(action, request))
+                except HTTPException as e:
+                    results[self.node_name] = (
+                        e.status_code,
+                        None,
+                        {"detail": e.detail},
+                    )
+            return {
+                node: (
+                    {"error": str(result)}
+                    if isinstance(result, PeerError)
+                    else {"status_code": result[0], "response": result[2]}
+                )
+                for node, result in results.items()
+            }
+
+    def _control(self, action, process_name):
+        if process_name not in self.manager.processes:
+            raise HTTPException(
+                status_code=404, detail=f"Process '{process_name}' not found"
+            )
+        job = self._submit_control(action, process_name)
+        verb = "starting" if action == "start" else "stopping"
+        return {"result": f"Process '{process_name}' {verb}.", "job": job.id}
+
+    def _bulk(self, action, request):
+        if action not in ("start", "stop", "restart"):
+            raise HTTPException(
+                status_code=404, detail=f"Unsupported bulk action '{action}'"
+            )
+        names = self.manager.select(request.names, request.tag, request.pattern)
+        if not names:
+            raise HTTPException(
+                status_code=404, detail="No process matches the selection"
+            )
+
+        def run(job):
+            job.progress = {"done": 0, "total": len(names)}
+
+            def on_result(name, result):
+                job.progress["done"] += 1
+
+            return self.manager.bulk(
+                action,
+                names,
+                parallelism=request.parallelism,
+                batch_size=request.batch_size,
+                on_result=on_result,
+            )
+
+        job = self.jobs.submit(action, names, run)
+        return {
+            "result": f"{action.capitalize()} of {len(names)} processes queued.",
+            "job": job.id,
+        }
+
+    def _submit_control(self, action, process_name):
+        """Run start/stop of a process as a background job."""
+        control = getattr(self.manager, f"{action}_process")
+
+        def run(job):
+            control(process_name)
+            return {"status": self.manager.processes[process_name].status}
+
+        return self.jobs.submit(action, process_name, run)
+
+    async def _event_stream(self, request, seq, keepalive=15):
+        """
+        Server-Sent Events stream of status and health changes. A client
+        without a valid resume point first receives a "snapshot" event with the
+        summary of every process, then one "status" event per change, each
+        tagged with its sequence number.
+        """
+        events = self.manager.events
+        while not await request.is_disconnected():
+            pending = events.since(seq) if seq is not None else None
+            if pending is None:
+                seq, statuses = self.manager.status_snapshot()
+                yield _sse_message("snapshot", seq, statuses)
+            for event in pending or []:
+                seq = event["seq"]
+                yield _sse_message("status", seq, {event["name"]: event["summary"]})
+            if not await events.wait(seq, timeout=keepalive):
+                yield ": keepalive\n\n"
+
+    async def _follow_output(self, output, lines):
+        """Stream the last lines of a process output, then everything it prints."""
+        data, offset = output.tail(lines)
+        yield data
+        while True:
+            await output.wait(offset)
+            data, offset = output.read(offset)
+            yield data
+
     def run(self, host="localhost", port=5555, debug=True):
+        if hasattr(signal, "SIGHUP"):
+            # Handled by the event loop: a plain signal handler could run in
+            # the middle of a submit() holding the lock of the job runner.
+            self.app.router.add_event_handler(
+                "startup",
+                lambda: asyncio.get_running_loop().add_signal_handler(
+                    signal.SIGHUP, self.submit_reload
+                ),
+            )
+
         if not self.headless:
             webbrowser.open(f"http://{host}:{port}")
 
+        options = {}
+        # Event streams never end on their own. Older uvicorn versions cannot
+        # bound the graceful shutdown, and wait for the dashboards to close.
+        if "timeout_graceful_shutdown" in inspect.signature(uvicorn.Config).parameters:
+            options["timeout_graceful_shutdown"] = 2
         uvicorn.run(
-            self.app, host=host, port=port, log_level="debug" if debug else "info"
+            self.app,
+            host=host,
+            port=port,
+            log_level="debug" if debug else "info",
+            **options,
         )
 
 
+def _model_dict(model, **kwargs):
+    # pydantic 2 renamed dict() to model_dump(), and deprecated the former.
+    dump = getattr(model, "model_dump", None) or model.dict
+    return dump(**kwargs)
+
+
+def _sse_message(event, seq, data):
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 if __name__ == "__main__":
     interface = ProcessManagerWebInterface("processes.yaml")
     interface.run()
@@ -0,0 +1,96 @@
+import os
+import signal
+import subprocess
+import time
+
+SIGKILL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+
+def signal_process(process, sig):
+    """
+    Send sig to the process group of the child of process, so that whatever
+    it spawned gets it too, or to the child alone when it does not lead its own
+    group.
+    """
+    popen = getattr(process, "process", None)
+    try:
+        if process.process_group is not None:
+            os.killpg(process.process_group, sig)
+        elif popen is not None and popen.poll() is None:
+            popen.send_signal(sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def has_exited(process):
+    """Whether the child of process and everything left in its group are gone."""
+    popen = getattr(process, "process", None)
+    if popen is not None and popen.poll() is None:
+        return False
+    if process.process_group is None:
+        return True
+    try:
+        os.killpg(process.process_group, 0)
+    except (ProcessLookupError, PermissionError):
+        return True
+    return not _has_live_member(process.process_group)
+
+
+def _has_live_member(pgid):
+    # Zombies do not count: once orphaned, they only wait for init to reap
+    # them, which some container inits never do.
+    try:
+        pids = os.listdir("/proc")
+    except OSError:
+        return True
+    for pid in pids:
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # state, ppid and pgrp follow the parenthesized command name.
+        fields = stat[stat.rfind(b")") + 2 :].split()
+        if int(fields[2]) == pgid and fields[0] not in (b"Z", b"X"):
+            return True
+    return False
+
+
+def terminate(processes, grace=None, poll_interval=0.02):
+    """
+    Stop the children of processes together: SIGTERM is sent to every process
+    group at once, then they are all waited for against the same clock, and
+    the groups still alive once their grace period (stop_timeout, or grace for
+    all of them) expired are sent SIGKILL. Stopping many processes takes as
+    long as the longest grace period, not the sum of them.
+    Returns the processes that had to be killed.
+    """
+    started = time.monotonic()
+    pending = [p for p in processes if getattr(p, "process", None) is not None]
+    for process in pending:
+        signal_process(process, signal.SIGTERM)
+
+    killed = []
+    while pending:
+        elapsed = time.monotonic() - started
+        alive = []
+        for process in pending:
+            if has_exited(process):
+                continue
+            if elapsed >= (process.stop_timeout if grace is None else grace):
+                signal_process(process, SIGKILL)
+                killed.append(process)
+            else:
+                alive.append(process)
+        pending = alive
+        if pending:
+            time.sleep(poll_interval)
+
+    for process in killed:
+        try:
+            process.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+    return killed
@@ -0,0 +1,127 @@
+import json
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+
+DEFAULT_FIELDS = ("status", "health")
+
+
+class StatusSnapshot:
+    """
+    Versioned view of the state of every process, served by /api/status and
+    /api/info. The version is bumped whenever a process changes, and only the
+    entries of the processes that changed are rebuilt. Each entry keeps its
+    JSON serialization for the default and the full set of fields, and
+    rendered responses are cached per version, so polls that find nothing new
+    cost a lookup.
+    """
+
+    def __init__(self, manager, max_variants=64):
+        self.manager = manager
+        self.max_variants = max_variants
+        self.version = 0
+        # Versions restart from 0 with proman, ETags must not.
+        self.instance = uuid.uuid4().hex[:8]
+        # name -> (entry, JSON of the default fields, JSON of all the fields)
+        self._entries = {}
+        self._dirty = set()
+        self._variants = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, name):
+        with self._lock:
+            self.version += 1
+            self._dirty.add(name)
+
+    def etag(self, version, fields=None, offset=0, limit=None):
+        """ETag of the rendering of version for the given query."""
+        fields = tuple(fields) if fields else DEFAULT_FIELDS
+        variant = zlib.crc32(repr((fields, offset, limit)).encode())
+        return f'"{self.instance}-{version}-{variant:08x}"'
+
+    def entry(self, name):
+        """Return a copy of the entry of a process, or None if there is none."""
+        with self._lock:
+            self._refresh()
+            cached = self._entries.get(name)
+        return dict(cached[0]) if cached is not None else None
+
+    def render(self, fields=None, offset=0, limit=None):
+        """
+        Return (version, total, body): the JSON object mapping the names of the
+        processes in [offset, offset + limit) to their entries, restricted to
+        fields ("all" for every field, the status and health by default).
+        """
+        fields = tuple(fields) if fields else DEFAULT_FIELDS
+        with self._lock:
+            key = (self.version, fields, offset, limit)
+            cached = self._variants.get(key)
+            if cached is not None:
+                self._variants.move_to_end(key)
+                return cached
+
+            names = list(self.manager.processes)
+            self._refresh()
+            page = names[offset : None if limit is None else offset + limit]
+            fragments = []
+            for name in page:
+                if name not in self._entries:
+                    # Unregistered in the meantime.
+                    continue
+                entry, default_json, full_json = self._entries[name]
+                if fields == DEFAULT_FIELDS:
+                    fragment = default_json
+                elif fields == ("all",):
+                    fragment = full_json
+                else:
+                    fragment = _dumps({field: entry.get(field) for field in fields})
+                fragments.append(f"{_dumps(name)}:{fragment}")
+            body = ("{" + ",".join(fragments) + "}").encode()
+
+            cached = (self.version, len(names), body)
+            self._variants[key] = cached
+            while len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)
+            return cached
+
+    def _refresh(self):
+        # Called with the lock held.
+        processes = self.manager.processes
+        stale = self._dirty | (processes.keys() - self._entries.keys())
+        self._dirty = set()
+        for name in stale:
+            process = processes.get(name)
+            if process is None:
+                self._entries.pop(name, None)
+                continue
+            entry = _build_entry(process)
+            self._entries[name] = (
+                entry,
+                _dumps({field: entry[field] for field in DEFAULT_FIELDS}),
+                _dumps(entry),
+            )
+
+
+def _build_entry(process):
+    popen = getattr(process, "process", None)
+    entry = {
+        "status": process.status,
+        "health": process.health,
+        "pid": getattr(popen, "pid", None) if process.status == "running" else None,
+        "exit_code": process.exit_code,
+        "started_at": process.started_at,
+        "restart": process.restart_policy.mode,
+        "restarts": process.restart_count,
+        "group": process.group,
+        "tags": process.tags,
+        "depends_on": process.depends_on,
+    }
+    if process.healthcheck is not None and process.healthcheck.last_error:
+        entry["health_error"] = process.healthcheck.last_error
+    entry.update(process.describe())
+    return entry
+
+
+def _dumps(value):
+    return json.dumps(value, default=str, separators=(",", ":"))
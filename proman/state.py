@@ -0,0 +1,141 @@
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+
+def proc_start_time(pid):
+    """
+    Start time of a pid in clock ticks since boot, read from /proc. Together
+    with the pid it identifies a process even across pid reuse.
+    Returns None when the pid does not exist (or is a zombie) or /proc is not
+    available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as stat_file:
+            stat = stat_file.read()
+    except (OSError, TypeError):
+        return None
+    fields = stat[stat.rfind(b")") + 2 :].split()
+    if fields[0] in (b"Z", b"X"):
+        return None
+    return int(fields[19])
+
+
+class AdoptedProcess:
+    """
+    Popen-like handle for a child started by a previous proman instance.
+    It is not our child, so it cannot be waited for: its liveness is checked
+    through /proc and its exit code is unknown, reported as -1.
+    """
+
+    def __init__(self, pid, start_time):
+        self.pid = pid
+        self.start_time = start_time
+        self.returncode = None
+        self.stdout = None
+
+    def poll(self):
+        if self.returncode is None and proc_start_time(self.pid) != self.start_time:
+            self.returncode = -1
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(f"pid {self.pid}", timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+class StateStore:
+    """
+    Compact JSON file recording the running children (pid, start time, config
+    hash), so that a restarted proman can re-adopt them instead of spawning
+    duplicates. Changes are batched and written at most once per
+    flush_interval seconds, atomically and fsync'ed.
+    """
+
+    def __init__(self, filepath, flush_interval=1.0):
+        self.filepath = Path(filepath)
+        self.flush_interval = flush_interval
+        self._entries = self._read()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def get(self, name):
+        with self._lock:
+            return self._entries.get(name)
+
+    def names(self):
+        with self._lock:
+            return list(self._entries)
+
+    def set(self, name, entry):
+        with self._lock:
+            self._entries[name] = entry
+            self._schedule_flush()
+
+    def discard(self, name):
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                self._schedule_flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                # A flush of its own makes the pending one redundant.
+                timer, self._timer = self._timer, None
+                if timer is not None:
+                    timer.cancel()
+                payload = json.dumps(self._entries)
+            self.filepath.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.filepath.with_name(self.filepath.name + ".tmp")
+            with open(tmp_path, "w") as tmp_file:
+                tmp_file.write(payload)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, self.filepath)
+            _fsync_directory(self.filepath.parent)
+
+    def _schedule_flush(self):
+        # Called with the lock held.
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _read(self):
+        try:
+            return json.loads(self.filepath.read_text())
+        except (OSError, ValueError):
+            return {}
+
+
+def _fsync_directory(path):
+    # Makes the rename durable; directories cannot be opened on every platform.
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,115 @@
+import os
+import selectors
+import threading
+
+
+class Supervisor:
+    """
+    Reaps the children of all watched processes from a single thread and
+    reports each exit to its Process, and then to on_exit, as soon as it
+    happens.
+    On Linux every child is watched through a pidfd, so the loop sleeps until
+    a child exits and handles each exit in O(1). Where pidfds are not available
+    the children are polled every poll_interval seconds instead.
+    """
+
+    def __init__(self, on_exit=None, poll_interval=1.0):
+        self.on_exit = on_exit
+        self.poll_interval = poll_interval
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._polled = {}
+        self._thread = None
+        self._closed = False
+
+    def watch(self, process):
+        """Start watching the child currently held by process.process."""
+        popen = getattr(process, "process", None)
+        if popen is None or not hasattr(popen, "poll"):
+            return
+        with self._lock:
+            self._pending.append((process, popen))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="proman-supervisor", daemon=True
+                )
+                self._thread.start()
+        self._wakeup()
+
+    def close(self):
+        self._closed = True
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _run(self):
+        while not self._closed:
+            timeout = self.poll_interval if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj == self._wakeup_r:
+                    os.read(self._wakeup_r, 4096)
+                    self._register_pending()
+                else:
+                    self._selector.unregister(key.fileobj)
+                    os.close(key.fileobj)
+                    self._reap(*key.data)
+            for pid, (process, popen) in list(self._polled.items()):
+                if popen.poll() is not None:
+                    del self._polled[pid]
+                    self._reap(process, popen)
+
+    def _register_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for process, popen in pending:
+            try:
+                pidfd = os.pidfd_open(popen.pid)
+            except (AttributeError, OSError):
+                self._polled[popen.pid] = (process, popen)
+            else:
+                self._selector.register(
+                    pidfd, selectors.EVENT_READ, data=(process, popen)
+                )
+
+    def _reap(self, process, popen):
+        # poll() waits on this single pid, it does not scan other children.
+        returncode = popen.poll()
+        if returncode is None:
+            # Not reapable yet, keep an eye on it through the polling fallback.
+            self._polled[popen.pid] = (process, popen)
+            return
+        # Held while the process is being stopped or restarted, up to its
+        # stop_timeout: report such exits from another thread once it is
+        # released, so that the exits of the other processes are not delayed.
+        if not process._lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._report_locked,
+                args=(process, popen, returncode),
+                name="proman-supervisor-exit",
+                daemon=True,
+            ).start()
+            return
+        try:
+            self._report(process, popen, returncode)
+        finally:
+            process._lock.release()
+
+    def _report_locked(self, process, popen, returncode):
+        with process._lock:
+            self._report(process, popen, returncode)
+
+    def _report(self, process, popen, returncode):
+        # Under the process lock, a concurrent restart has either not stopped
+        # this child yet or already replaced it.
+        if getattr(process, "process", None) is popen:
+            process._on_exit(returncode)
+            if self.on_exit is not None:
+                self.on_exit(process, returncode)
@@ -0,0 +1,402 @@
+import heapq
+import itertools
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from proman.shutdown import terminate
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Schedules
+# ------------------------------------------------------------------------------
+
+
+class IntervalSchedule:
+    """Run every `every` seconds."""
+
+    def __init__(self, every):
+        self.every = float(every)
+        if self.every <= 0:
+            raise ValueError(f"Invalid schedule interval {every}, expected > 0")
+
+    def next_time(self, after):
+        return after + self.every
+
+    def __str__(self):
+        return f"every {self.every:g}s"
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression (minute, hour, day of month, month,
+    day of week with 0 or 7 for Sunday), in local time. Fields accept *,
+    numbers, ranges (a-b), lists (a,b) and steps (*/n, a-b/n, a/n). As in cron,
+    when both the day of month and the day of week are restricted, a day
+    matching either of them matches.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        self.expression = expression
+        parts = str(expression).split()
+        if len(parts) != 5:
+            raise ValueError(
+                f"Invalid cron expression '{expression}', expected 5 fields"
+            )
+        fields = [
+            _parse_field(part, low, high, expression)
+            for part, (low, high) in zip(parts, self.FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {day % 7 for day in weekdays}
+        self.days_restricted = not parts[2].startswith("*")
+        self.weekdays_restricted = not parts[4].startswith("*")
+        # Expressions like "0 0 30 2 *" never match.
+        self.next_time(time.time())
+
+    def next_time(self, after):
+        """The first matching minute strictly after the timestamp after."""
+        moment = datetime.fromtimestamp(after).replace(second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+        # Long enough to reach the next February 29th.
+        limit = moment + timedelta(days=366 * 8)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        # datetime counts weekdays from Monday = 0, cron from Sunday = 0.
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day or weekday
+        return day and weekday
+
+    def __str__(self):
+        return f"cron {self.expression}"
+
+
+def _parse_field(field, low, high, expression):
+    error = ValueError(f"Invalid field '{field}' in cron expression '{expression}'")
+    values = set()
+    for part in field.split(","):
+        span, slash, step = part.partition("/")
+        try:
+            step = int(step) if slash else 1
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(bound) for bound in span.split("-", 1))
+            else:
+                # a/n runs from a to the end of the range.
+                start = int(span)
+                end = high if slash else start
+        except ValueError:
+            raise error from None
+        if step < 1 or not low <= start <= end <= high:
+            raise error
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_schedule(config):
+    """The schedule of a task, from {every: seconds} or {cron: expression}."""
+    if not config:
+        return None
+    if "every" in config and "cron" not in config:
+        return IntervalSchedule(config["every"])
+    if "cron" in config and "every" not in config:
+        return CronSchedule(config["cron"])
+    raise ValueError("A schedule needs exactly one of 'every' or 'cron'")
+
+
+# ------------------------------------------------------------------------------
+# Timers
+# ------------------------------------------------------------------------------
+
+
+class TimerHandle:
+    """A callback queued on a TimerQueue, until it runs or is cancelled."""
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerQueue:
+    """
+    Runs callbacks at given wall clock times from a single thread, waiting on
+    a heap of their due times, however many timers are armed. Callbacks must
+    be short, as they delay the ones due after them. Cancelled timers are
+    dropped from the heap when they come due.
+    """
+
+    def __init__(self, name="proman-timers"):
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def call_at(self, when, callback, *args):
+        return self.push(TimerHandle(when, callback, args))
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(time.time() + delay, callback, *args)
+
+    def push(self, handle):
+        """Queue a TimerHandle built beforehand, e.g. to pass it to its callback."""
+        with self._condition:
+            heapq.heappush(self._heap, (handle.when, next(self._counter), handle))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._heap = []
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    when, _, handle = self._heap[0]
+                    if handle.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    # Bounded, so that wall clock changes are noticed.
+                    delay = when - time.time()
+                    if delay > 0:
+                        self._condition.wait(min(delay, 60))
+                        continue
+                    heapq.heappop(self._heap)
+                    break
+            try:
+                handle.callback(*handle.args)
+            except Exception:
+                logger.exception("Timer callback failed")
+
+
+# ------------------------------------------------------------------------------
+# Worker pool
+# ------------------------------------------------------------------------------
+
+
+class TaskPool:
+    """
+    Runs the runs of TaskProcesses on at most max_workers threads, in the
+    order they were queued. A worker spawns the command of the task and waits
+    for it, so that it is reaped as soon as it exits and never lingers as a
+    zombie, then records the run in the history of the task.
+    Schedules and retries are timers queueing runs, all of them on a single
+    TimerQueue thread. A run is never queued
+    while the previous run of the same task is queued, running or waiting for
+    a retry, so slow tasks do not pile up.
+    """
+
+    def __init__(self, manager, max_workers=4):
+        self.manager = manager
+        self.max_workers = max_workers
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._workers = 0
+        self._idle = 0
+        self._closed = False
+        self._timers = TimerQueue()
+
+    def start(self, task, run_now=False):
+        """Arm the schedule of task, and queue a run if it has none or run_now."""
+        if task.schedule is not None:
+            self._arm(task)
+        if task.schedule is None or run_now:
+            self.submit(task, "manual" if run_now else "start")
+
+    def submit(self, task, trigger, attempt=1):
+        """Queue a run of task. Returns False if a run is already in progress."""
+        with task._lock:
+            if trigger == "retry" and task.status != "restarting":
+                # Stopped or started by hand while waiting for the retry.
+                return False
+            busy = ("queued", "running")
+            if trigger in ("start", "schedule"):
+                busy += ("restarting",)
+            if self._closed or task.status in busy:
+                logger.debug(
+                    "Task run skipped, the previous one is not finished",
+                    extra={"process_name": task.name, "trigger": trigger},
+                )
+                return False
+            # A manual run replaces a pending retry.
+            self.manager._cancel_restart(task)
+            task.status = "queued"
+        with self._condition:
+            self._queue.append((task, trigger, attempt))
+            if len(self._queue) > self._idle and self._workers < self.max_workers:
+                self._workers += 1
+                threading.Thread(
+                    target=self._work,
+                    name=f"proman-task-{self._workers}",
+                    daemon=True,
+                ).start()
+            self._condition.notify()
+        return True
+
+    def cancel(self, task):
+        """
+        Disarm the schedule of task, drop its queued run or pending retry, and
+        stop its running one.
+        """
+        with task._lock:
+            self._disarm(task)
+            self.manager._cancel_restart(task)
+            with self._condition:
+                self._queue = deque(item for item in self._queue if item[0] is not task)
+            if task.status == "running":
+                task._stopping = True
+                task.stop()
+                task.stopped_at = time.time()
+            elif task.status in ("queued", "restarting"):
+                task.status = "stopped"
+
+    def close(self):
+        """Disarm every schedule and drop the queued runs, on shutdown."""
+        with self._condition:
+            self._closed = True
+            queued, self._queue = self._queue, deque()
+            self._condition.notify_all()
+        for process in list(self.manager.processes.values()):
+            if getattr(process, "schedule", None) is not None:
+                with process._lock:
+                    self._disarm(process)
+        for task, _, _ in queued:
+            with task._lock:
+                if task.status == "queued":
+                    task.status = "stopped"
+        self._timers.close()
+
+    def _arm(self, task):
+        with task._lock:
+            self._disarm(task)
+            task.next_run = task.schedule.next_time(time.time())
+            timer = TimerHandle(task.next_run, self._fire, ())
+            timer.args = (task, timer)
+            task._schedule_timer = timer
+            self._timers.push(timer)
+        self.manager.snapshot.invalidate(task.name)
+
+    def _disarm(self, task):
+        timer, task._schedule_timer = task._schedule_timer, None
+        task.next_run = None
+        if timer is not None:
+            timer.cancel()
+
+    def _fire(self, task, timer):
+        # Checked first as well, so that a task being stopped, which holds its
+        # lock, does not hold up the timer thread.
+        if task._schedule_timer is not timer:
+            return
+        with task._lock:
+            # Disarmed or re-armed in the meantime.
+            if task._schedule_timer is not timer:
+                return
+            self._arm(task)
+        self.submit(task, "schedule")
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    if self._closed:
+                        self._workers -= 1
+                        return
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                task, trigger, attempt = self._queue.popleft()
+            self._run(task, trigger, attempt)
+
+    def _run(self, task, trigger, attempt):
+        with task._lock:
+            # Cancelled while queued.
+            if task.status != "queued":
+                return
+            started_at = time.time()
+            spawning = time.perf_counter()
+            task._start()
+            self.manager.prometheus.observe_start(task, time.perf_counter() - spawning)
+            popen = task.process if task.status == "running" else None
+
+        returncode = None
+        timed_out = False
+        if popen is not None:
+            try:
+                returncode = popen.wait(timeout=task.timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                terminate([task])
+                returncode = popen.poll()
+        finished_at = time.time()
+
+        with task._lock:
+            run = {
+                "trigger": trigger,
+                "attempt": attempt,
+                "started_at": started_at,
+                "duration": round(finished_at - started_at, 6),
+                "exit_code": returncode,
+                "timed_out": timed_out,
+            }
+            task.history.append(run)
+            if popen is not None:
+                task.exit_code = returncode
+                task.stopped_at = finished_at
+            if task._stopping:
+                task.status = "stopped"
+            elif returncode == 0:
+                task.status = "stopped"
+            elif attempt <= task.retries:
+                task.status = "restarting"
+                task._restart_timer = self._timers.call_later(
+                    task.retry_delay, self.submit, task, "retry", attempt + 1
+                )
+            else:
+                task.status = "failed"
+        logger.log(
+            logging.INFO if returncode == 0 else logging.WARNING,
+            "Task finished",
+            extra={"process_name": task.name, **run},
+        )
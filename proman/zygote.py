@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import subprocess
+import threading
+from pathlib import Path
+
+from proman.state import proc_start_time
+
+logger = logging.getLogger(__name__)
+
+ZYGOTE_SERVER = str(Path(__file__).with_name("zygote_server.py"))
+MAX_MESSAGE_BYTES = 1 << 20
+
+
+class ZygoteChild:
+    """
+    Popen-like handle for a child forked by a Zygote. It is the zygote's
+    child, not ours: its exit code is reported by the zygote. Should the
+    zygote die first, the exit is only detected through /proc and reported
+    as -1.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.start_time = proc_start_time(pid)
+        self.returncode = None
+        self.stdout = None
+        self._exited = threading.Event()
+
+    def _set_exit(self, returncode):
+        self.returncode = returncode
+        self._exited.set()
+
+    def poll(self):
+        if self.returncode is None and not self._exited.is_set():
+            alive = (
+                self.start_time is not None
+                and proc_start_time(self.pid) == self.start_time
+            )
+            # Once the child is gone its exit code is on its way from the zygote.
+            if not alive and not self._exited.wait(1.0):
+                self.returncode = -1
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout) and self.poll() is None:
+            raise subprocess.TimeoutExpired(f"pid {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class Zygote:
+    """
+    A warm interpreter that has already imported the preload modules and forks
+    a child for each start of a PythonProcess, instead of cold-starting an
+    interpreter that imports them all over again. Requests and replies travel
+    over a SOCK_SEQPACKET socket pair, the output pipe of the child is passed
+    along with SCM_RIGHTS. The zygote is launched on first use and relaunched
+    if it died.
+    """
+
+    def __init__(self, interpreter, preload=(), startup_timeout=300.0):
+        self.interpreter = interpreter
+        self.preload = tuple(preload)
+        self.startup_timeout = startup_timeout
+        self.popen = None
+        self._socket = None
+        self._replies = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_supported():
+        return hasattr(os, "fork") and hasattr(socket, "send_fds")
+
+    def is_alive(self):
+        return self.popen is not None and self.popen.poll() is None
+
+    def spawn(self, argv, cwd=None, env=None, stdout=None, new_session=False):
+        """
+        Fork a child running `python <argv>`. When stdout is a file descriptor,
+        the output of the child is redirected to it.
+        """
+        request = {"argv": argv, "cwd": cwd, "env": env, "new_session": new_session}
+        with self._lock:
+            if not self.is_alive():
+                self._launch()
+            fds = [stdout] if stdout is not None else []
+            socket.send_fds(self._socket, [json.dumps(request).encode()], fds)
+            reply = self._replies.get()
+        if "error" in reply:
+            raise RuntimeError(f"Zygote failed to spawn {argv[0]}: {reply['error']}")
+        return reply["child"]
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _launch(self):
+        self.close()
+        parent_socket, child_socket = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+        with child_socket:
+            self.popen = subprocess.Popen(
+                [self.interpreter, ZYGOTE_SERVER, str(child_socket.fileno())]
+                + list(self.preload),
+                pass_fds=[child_socket.fileno()],
+            )
+        self._socket = parent_socket
+        self._replies = queue.Queue()
+        threading.Thread(
+            target=self._read_messages,
+            args=(parent_socket, self._replies),
+            name=f"proman-zygote-{self.popen.pid}",
+            daemon=True,
+        ).start()
+        try:
+            reply = self._replies.get(timeout=self.startup_timeout)
+        except queue.Empty:
+            reply = {"error": f"not ready after {self.startup_timeout} seconds"}
+        if "error" in reply:
+            self.popen.kill()
+            raise RuntimeError(
+                f"Zygote for {self.interpreter} failed: {reply['error']}"
+            )
+        logger.info(
+            "Zygote started",
+            extra={
+                "interpreter": self.interpreter,
+                "pid": self.popen.pid,
+                "preload": list(self.preload),
+            },
+        )
+
+    def _read_messages(self, sock, replies):
+        children = {}
+        while True:
+            try:
+                data = sock.recv(MAX_MESSAGE_BYTES)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            message = json.loads(data)
+            if "exited" in message:
+                child = children.pop(message["exited"], None)
+                if child is not None:
+                    child._set_exit(message["code"])
+            elif "spawned" in message:
+                # Registered here, before any exit of the child can be read.
+                child = ZygoteChild(message["spawned"])
+                children[child.pid] = child
+                replies.put({"child": child})
+            else:
+                replies.put(message)
+        replies.put({"error": "the zygote exited"})
+
+
+_zygotes = {}
+_zygotes_lock = threading.Lock()
+
+
+def get_zygote(interpreter, preload=()):
+    """Return the shared zygote of an interpreter and list of preloaded modules."""
+    key = (interpreter, tuple(preload))
+    with _zygotes_lock:
+        if key not in _zygotes:
+            _zygotes[key] = Zygote(interpreter, preload)
+        return _zygotes[key]
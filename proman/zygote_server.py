@@ -0,0 +1,150 @@
+"""
+Zygote of PythonProcess spawn_mode: zygote.
+
+It runs under the interpreter of the processes it spawns, imports the preload
+modules once and then forks a child for every spawn request received on its
+control socket. The child runs the target script with runpy, as `python
+<target> <args>` would. It only depends on the standard library, as proman is
+not necessarily installed in the target interpreter.
+
+Usage: python zygote_server.py <control socket fd> [module ...]
+"""
+
+import importlib
+import json
+import os
+import runpy
+import selectors
+import signal
+import socket
+import sys
+import traceback
+
+MAX_MESSAGE_BYTES = 1 << 20
+
+
+def main(sock_fd, modules):
+    sock = socket.socket(fileno=sock_fd)
+    try:
+        for module in modules:
+            importlib.import_module(module)
+    except BaseException:
+        _send(sock, {"error": traceback.format_exc()})
+        return 1
+    _send(sock, {"ready": os.getpid()})
+
+    # SIGCHLD wakes up the selector through the wakeup pipe.
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    # Ctrl+C in proman's terminal is handled by proman, which stops the children.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj == wakeup_r:
+                while _drain(wakeup_r):
+                    pass
+                _reap_children(sock)
+                continue
+            message, fds, _, _ = socket.recv_fds(sock, MAX_MESSAGE_BYTES, 3)
+            if not message:
+                # proman went away.
+                return 0
+            try:
+                pid = _fork_child(json.loads(message), fds, (sock, wakeup_r, wakeup_w))
+            except OSError as e:
+                _send(sock, {"error": str(e)})
+            else:
+                _send(sock, {"spawned": pid})
+            finally:
+                for fd in fds:
+                    os.close(fd)
+
+
+def _fork_child(request, fds, inherited):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Child: drop the zygote state and become `python <target> <args>`.
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    for handle in inherited:
+        if isinstance(handle, socket.socket):
+            handle.close()
+        else:
+            os.close(handle)
+    if request.get("new_session"):
+        os.setsid()
+    if fds:
+        os.dup2(fds[0], 1)
+        os.dup2(fds[0], 2)
+    if request.get("cwd"):
+        os.chdir(request["cwd"])
+    if request.get("env") is not None:
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+    argv = request["argv"]
+    sys.argv = list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(argv[0])))
+    code = 0
+    try:
+        runpy.run_path(argv[0], run_name="__main__")
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _reap_children(sock):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        _send(sock, {"exited": pid, "code": os.waitstatus_to_exitcode(status)})
+
+
+def _drain(fd):
+    try:
+        return os.read(fd, 4096)
+    except BlockingIOError:
+        return b""
+
+
+def _send(sock, message):
+    try:
+        sock.send(json.dumps(message).encode())
+    except OSError:
+        # proman went away, its children keep running on their own.
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    # Run as a script, sys.path[0] is the proman package directory: drop it so
+    # that its modules cannot shadow the preloaded ones.
+    del sys.path[0]
+    sys.exit(main(int(sys.argv[1]), sys.argv[2:]))
@@ -0,0 +1,49 @@
+import textwrap
+import time
+
+import pytest
+
+from proman.config import ConfigParser
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Keep the parsed configuration and interpreter caches out of $HOME.
+    monkeypatch.setenv("PROMAN_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def write_config(tmp_path):
+    """Write a YAML configuration into the test directory, return its path."""
+
+    def write(text, name="processes.yaml"):
+        path = tmp_path / name
+        path.write_text(textwrap.dedent(text))
+        return path
+
+    return write
+
+
+@pytest.fixture
+def start_manager():
+    """Build managers from configuration files, stopping their children after the test."""
+    managers = []
+
+    def start(path, **kwargs):
+        manager = ConfigParser(path, cache=False).init_process_manager(**kwargs)
+        managers.append(manager)
+        return manager
+
+    yield start
+    for manager in managers:
+        manager.shutdown(detach=False)
+
+
+def wait_for(predicate, timeout=5.0, interval=0.02):
+    """Poll predicate until it holds, return whether it did within timeout."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
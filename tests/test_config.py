@@ -0,0 +1,109 @@
+import os
+
+import pytest
+from conftest import wait_for
+
+from proman.config import ConfigError, ConfigParser, ParsedConfigCache
+from proman.processes import ShellProcess
+
+
+def test_parse(write_config):
+    path = write_config("""
+        mapping: !ShellProcess
+          command: "exec sleep 30"
+          tags: [a]
+        shorthand: !ShellProcess "command='true' active=False"
+        """)
+    processes = ConfigParser(path, cache=False).parse()
+    assert isinstance(processes["mapping"], ShellProcess)
+    assert processes["mapping"].tags == ["a"]
+    assert processes["shorthand"].config == {"command": "true", "active": False}
+    assert not processes["shorthand"].active
+
+
+def test_every_error_is_reported(write_config):
+    path = write_config("""
+        untagged:
+          command: "true"
+        unknown: !NoSuchProcess
+          command: "true"
+        orphan: !ShellProcess
+          command: "true"
+          depends_on: [missing]
+        """)
+    with pytest.raises(ConfigError) as error:
+        ConfigParser(path, cache=False).parse()
+    assert len(error.value.errors) == 3
+    assert str(path) in str(error.value)
+
+
+def test_syntax_error(write_config):
+    path = write_config("app: !ShellProcess\n  command: [\n")
+    with pytest.raises(ConfigError, match=str(path)):
+        ConfigParser(path, cache=False).parse()
+
+
+def test_parsed_config_cache(write_config, tmp_path):
+    path = write_config("""
+        app: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: []
+        """)
+    cache = ParsedConfigCache(tmp_path / "configs")
+    parser = ConfigParser(path)
+    parser.cache = cache
+    parser.load()
+    key = cache.key(path.read_bytes())
+    cached = cache.get(key)
+    assert cached["app"].class_name == "ShellProcess"
+    assert cached["app"].config == {"command": "exec sleep 30", "depends_on": []}
+    # A cache writable by others is never trusted.
+    os.chmod(cache.directory / f"{key}.json", 0o666)
+    assert cache.get(key) is None
+
+
+def test_streaming_starts_processes(write_config, start_manager):
+    path = write_config("""
+        db: !ShellProcess
+          command: "exec sleep 30"
+        api: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [db]
+        idle: !ShellProcess
+          command: "exec sleep 30"
+          active: false
+        """)
+    manager = start_manager(path, streaming=True)
+    assert manager.processes["db"].status == "running"
+    assert manager.processes["api"].status == "running"
+    assert manager.processes["idle"].status == "not started"
+
+
+def sleeping(seconds):
+    """Whether some process runs sleep with this exact argument."""
+    cmdline = f"sleep\0{seconds}\0".encode()
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdline_file:
+                if cmdline_file.read() == cmdline:
+                    return True
+        except OSError:
+            pass
+    return False
+
+
+def test_streaming_error_stops_started_processes(write_config):
+    path = write_config("""
+        early: !ShellProcess
+          command: "exec sleep 30.5"
+        a: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [b]
+        b: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [a]
+        """)
+    with pytest.raises(ConfigError, match="cycle"):
+        ConfigParser(path, cache=False).init_process_manager(streaming=True)
+    # early was started before the cycle was known, and is stopped again.
+    assert wait_for(lambda: not sleeping("30.5"))
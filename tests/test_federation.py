@@ -0,0 +1,175 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+from proman.federation import Federation, Peer, PeerError
+from proman.server import ProcessManagerWebInterface
+
+STATUS = {"app": {"status": "running", "health": None}}
+
+
+class FakePeer(BaseHTTPRequestHandler):
+    """A proman peer answering /api/status with STATUS, or misbehaving."""
+
+    mode = "ok"
+
+    def do_GET(self):
+        if self.mode == "slow":
+            time.sleep(1)
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        body = b"<html>" if self.mode == "invalid" else json.dumps(STATUS).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(mode):
+        handler = type("Handler", (FakePeer,), {"mode": mode})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_refresh(serve):
+    peer = Peer("good", serve("ok"))
+    peer.refresh()
+    assert peer.processes == STATUS
+    assert peer.etag == '"v1"'
+    # Unchanged: answered with a 304, the last status is kept.
+    peer.refresh()
+    assert peer.describe()["reachable"]
+    assert peer.processes == STATUS
+    peer.close()
+
+
+def test_unreachable_peer():
+    federation = Federation([Peer("dead", closed_port_url())])
+    status = federation.status()["dead"]
+    assert not status["reachable"]
+    assert status["error"].startswith("dead:")
+    federation.close()
+
+
+def test_invalid_json_answer(serve):
+    peer = Peer("broken", serve("invalid"))
+    with pytest.raises(PeerError, match="invalid JSON"):
+        peer.request("GET", "/api/status")
+    peer.refresh()
+    assert "invalid JSON" in peer.error
+    peer.close()
+
+
+def test_slow_peer_does_not_hold_up_the_others(serve):
+    federation = Federation(
+        [Peer("slow", serve("slow"), timeout=0.2), Peer("good", serve("ok"))]
+    )
+    started = time.monotonic()
+    status = federation.status()
+    assert time.monotonic() - started < 0.9
+    assert not status["slow"]["reachable"]
+    assert status["slow"]["error"].startswith("slow:")
+    assert status["good"]["reachable"]
+    assert status["good"]["processes"] == STATUS
+    federation.close()
+
+
+def test_peer_errors_are_kept_per_peer(serve):
+    federation = Federation([Peer("good", serve("ok")), Peer("broken", serve("ok"))])
+    results = federation.fan_out(
+        lambda peer: peer.name.upper() if peer.name == "good" else 1 / 0
+    )
+    assert results["good"] == "GOOD"
+    assert isinstance(results["broken"], PeerError)
+    federation.close()
+
+
+def test_duplicate_peer():
+    with pytest.raises(ValueError, match="Duplicate peer"):
+        Federation([Peer("a", "http://localhost:1"), Peer("a", "http://localhost:2")])
+
+
+def test_invalid_peer_url():
+    with pytest.raises(ValueError, match="Invalid URL"):
+        Peer("a", "localhost:5555")
+
+
+@pytest.fixture
+def client(serve, write_config):
+    path = write_config("""
+        local: !ShellProcess
+          command: "exec sleep 30"
+        """)
+    peers = [
+        Peer("good", serve("ok")),
+        Peer("broken", serve("invalid")),
+        Peer("dead", closed_port_url()),
+    ]
+    interface = ProcessManagerWebInterface(
+        path, headless=True, peers=peers, node_name="here"
+    )
+    with TestClient(interface.app) as client:
+        yield client
+
+
+def test_federation_status(client):
+    response = client.get("/api/federation/status")
+    assert response.status_code == 200
+    nodes = response.json()["nodes"]
+    assert nodes["here"]["processes"]["local"]["status"] == "running"
+    assert nodes["good"]["processes"] == STATUS
+    assert not nodes["broken"]["reachable"]
+    assert "invalid JSON" in nodes["broken"]["error"]
+    assert not nodes["dead"]["reachable"]
+
+
+def test_federation_control(client):
+    assert client.post("/api/federation/good/stop/app").status_code == 200
+    assert client.post("/api/federation/broken/stop/app").status_code == 502
+    assert client.post("/api/federation/dead/stop/app").status_code == 502
+    assert client.post("/api/federation/missing/stop/app").status_code == 404
+    assert client.post("/api/federation/here/stop/local").status_code == 202
+
+
+def test_federation_bulk(client):
+    response = client.post("/api/federation/bulk/stop", json={"names": ["local"]})
+    results = response.json()
+    assert results["here"]["status_code"] == 202
+    assert results["good"]["status_code"] == 200
+    assert "invalid JSON" in results["broken"]["error"]
+    assert "error" in results["dead"]
+    response = client.post("/api/federation/bulk/stop", json={"nodes": ["other"]})
+    assert response.status_code == 404
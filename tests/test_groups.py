@@ -0,0 +1,69 @@
+from proman.groups import _render
+
+
+def test_render_placeholders():
+    variables = {"name": "web-1", "group": "web", "index": 1, "port": 8001}
+    rendered = _render(
+        {"command": "serve --port {port} --id {index}", "tags": ["{group}"]},
+        variables,
+    )
+    assert rendered == {"command": "serve --port 8001 --id 1", "tags": ["web"]}
+
+
+def test_render_leaves_other_braces_alone():
+    value = 'echo ${name} {"key": 1} {unknown}'
+    assert _render(value, {"name": "web-0"}) == value
+
+
+GROUP_CONFIG = """
+    web: !ShellProcess
+      command: "exec sleep 30 # port {port}"
+      replicas: 2
+      port_base: 8000
+    proxy: !ShellProcess
+      command: "exec sleep 30"
+      depends_on: [web]
+    """
+
+
+def test_replicas(write_config, start_manager):
+    manager = start_manager(write_config(GROUP_CONFIG))
+    assert sorted(manager.processes) == ["proxy", "web-0", "web-1"]
+    replica = manager.processes["web-1"]
+    assert replica.group == "web"
+    assert replica.replica_index == 1
+    assert "web" in replica.tags
+    assert manager.processes["proxy"].depends_on == ["web-0", "web-1"]
+
+
+def test_scale_up_and_down(write_config, start_manager):
+    manager = start_manager(write_config(GROUP_CONFIG))
+    pid = manager.processes["web-0"].process.pid
+
+    assert manager.scale("web", 4) == {"added": ["web-2", "web-3"], "removed": []}
+    assert all(manager.processes[f"web-{i}"].status == "running" for i in range(4))
+    assert manager.processes["web-3"].config["command"].endswith("port 8003")
+    assert manager.processes["proxy"].depends_on == [f"web-{i}" for i in range(4)]
+
+    assert manager.scale("web", 1) == {
+        "added": [],
+        "removed": ["web-1", "web-2", "web-3"],
+    }
+    assert sorted(manager.processes) == ["proxy", "web-0"]
+    # Replicas that are kept are not restarted.
+    assert manager.processes["web-0"].process.pid == pid
+    assert manager.processes["proxy"].depends_on == ["web-0"]
+
+
+def test_scale_to_zero_and_back(write_config, start_manager):
+    manager = start_manager(write_config(GROUP_CONFIG))
+    manager.scale("web", 0)
+    assert sorted(manager.processes) == ["proxy"]
+    assert manager.processes["proxy"].depends_on == []
+
+    manager.scale("web", 2)
+    assert manager.processes["proxy"].depends_on == ["web-0", "web-1"]
+    manager.stop_all()
+    assert manager.processes["proxy"].stopped_at <= min(
+        manager.processes[name].stopped_at for name in ("web-0", "web-1")
+    )
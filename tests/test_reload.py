@@ -0,0 +1,80 @@
+import pytest
+
+from proman.config import ConfigError, ConfigParser
+
+
+def reload(manager, path):
+    parser = ConfigParser(path, cache=False)
+    return manager.reload(parser.parse(), groups=parser.groups)
+
+
+def test_reload_applies_differences(write_config, start_manager):
+    path = write_config("""
+        kept: !ShellProcess
+          command: "exec sleep 30"
+        changed: !ShellProcess
+          command: "exec sleep 30"
+        removed: !ShellProcess
+          command: "exec sleep 30"
+        """)
+    manager = start_manager(path)
+    kept_pid = manager.processes["kept"].process.pid
+    changed_pid = manager.processes["changed"].process.pid
+    removed = manager.processes["removed"]
+
+    write_config("""
+        kept: !ShellProcess
+          command: "exec sleep 30"
+        changed: !ShellProcess
+          command: "exec sleep 31"
+        added: !ShellProcess
+          command: "exec sleep 30"
+        """)
+    assert reload(manager, path) == {
+        "added": ["added"],
+        "removed": ["removed"],
+        "changed": ["changed"],
+    }
+    assert sorted(manager.processes) == ["added", "changed", "kept"]
+    assert removed.status == "stopped"
+    assert manager.processes["kept"].process.pid == kept_pid
+    assert manager.processes["changed"].process.pid != changed_pid
+    assert manager.processes["changed"].status == "running"
+    assert manager.processes["added"].status == "running"
+
+
+def test_reload_keeps_output_of_changed_process(write_config, start_manager):
+    path = write_config("""
+        echo: !ShellProcess
+          command: "echo first; exec sleep 30"
+          readiness:
+            log_line: first
+            timeout: 5
+        """)
+    manager = start_manager(path)
+    output = manager.processes["echo"].output
+    write_config("""
+        echo: !ShellProcess
+          command: "echo second; exec sleep 30"
+        """)
+    reload(manager, path)
+    assert manager.processes["echo"].output is output
+    assert output.contains("first", 0)
+
+
+def test_invalid_reload_touches_nothing(write_config, start_manager):
+    path = write_config("""
+        app: !ShellProcess
+          command: "exec sleep 30"
+        """)
+    manager = start_manager(path)
+    pid = manager.processes["app"].process.pid
+    write_config("""
+        app: !ShellProcess
+          command: "exec sleep 31"
+          depends_on: [missing]
+        """)
+    with pytest.raises(ConfigError):
+        reload(manager, path)
+    assert manager.processes["app"].process.pid == pid
+    assert manager.processes["app"].status == "running"
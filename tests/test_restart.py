@@ -0,0 +1,87 @@
+from conftest import wait_for
+
+from proman.restart import RestartPolicy
+
+
+def test_backoff_grows_up_to_max():
+    policy = RestartPolicy(
+        {
+            "restart": "always",
+            "backoff": {"initial": 1, "multiplier": 2, "max": 5, "jitter": 0},
+            "crash_loop": {"max_restarts": 10},
+        }
+    )
+    assert [policy.next_delay() for _ in range(5)] == [1, 2, 4, 5, 5]
+
+
+def test_backoff_starts_over_after_a_long_uptime():
+    policy = RestartPolicy(
+        {"restart": "always", "backoff": {"jitter": 0}, "crash_loop": {"window": 10}}
+    )
+    policy.next_delay()
+    policy.next_delay()
+    assert policy.next_delay(uptime=10) == 1
+
+
+def test_crash_loop():
+    policy = RestartPolicy({"restart": "always", "crash_loop": {"max_restarts": 2}})
+    assert policy.next_delay() is not None
+    assert policy.next_delay() is not None
+    assert policy.next_delay() is None
+    policy.reset()
+    assert policy.next_delay() is not None
+
+
+def test_restart_modes():
+    assert not RestartPolicy({}).should_restart(1)
+    assert RestartPolicy({"restart": "always"}).should_restart(0)
+    on_failure = RestartPolicy({"restart": "on-failure"})
+    assert on_failure.should_restart(1)
+    assert not on_failure.should_restart(0)
+
+
+def test_crash_looping_process_fails(write_config, start_manager):
+    path = write_config("""
+        crasher: !ShellProcess
+          command: "exit 3"
+          restart: on-failure
+          backoff:
+            initial: 0.01
+          crash_loop:
+            max_restarts: 3
+        """)
+    manager = start_manager(path)
+    crasher = manager.processes["crasher"]
+    assert wait_for(lambda: crasher.status == "failed")
+    assert crasher.restart_count == 3
+    assert crasher.exit_code == 3
+
+
+def test_clean_exit_is_not_restarted(write_config, start_manager):
+    path = write_config("""
+        oneshot: !ShellProcess
+          command: "exit 0"
+          restart: on-failure
+          backoff:
+            initial: 0.01
+        """)
+    manager = start_manager(path)
+    oneshot = manager.processes["oneshot"]
+    assert wait_for(lambda: oneshot.status == "stopped")
+    assert oneshot.restart_count == 0
+
+
+def test_stop_cancels_pending_restart(write_config, start_manager):
+    path = write_config("""
+        crasher: !ShellProcess
+          command: "exit 1"
+          restart: always
+          backoff:
+            initial: 30
+        """)
+    manager = start_manager(path)
+    crasher = manager.processes["crasher"]
+    assert wait_for(lambda: crasher.status == "restarting")
+    manager.stop_process("crasher")
+    assert crasher._restart_timer is None
+    assert crasher.status != "restarting"
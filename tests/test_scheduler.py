@@ -0,0 +1,87 @@
+import pytest
+
+from proman.processes import ShellProcess
+from proman.scheduler import dependency_levels
+
+
+def make_processes(graph):
+    processes = {}
+    for name, depends_on in graph.items():
+        process = ShellProcess()
+        process._initialize({"command": "true", "depends_on": depends_on})
+        process.name = name
+        processes[name] = process
+    return processes
+
+
+def test_dependency_levels():
+    processes = make_processes(
+        {"db": [], "cache": [], "api": ["db", "cache"], "web": ["api"]}
+    )
+    assert dependency_levels(processes) == [["db", "cache"], ["api"], ["web"]]
+
+
+def test_dependency_levels_ignores_unselected_processes():
+    processes = make_processes({"db": [], "api": ["db"], "web": ["api"]})
+    assert dependency_levels(processes, ["web", "api"]) == [["api"], ["web"]]
+
+
+def test_dependency_cycle():
+    processes = make_processes({"a": ["b"], "b": ["a"], "c": []})
+    with pytest.raises(ValueError, match="cycle"):
+        dependency_levels(processes)
+
+
+def test_unknown_dependency():
+    processes = make_processes({"api": ["db"]})
+    with pytest.raises(ValueError, match="unknown process 'db'"):
+        dependency_levels(processes)
+
+
+def test_dependents_start_once_ready(write_config, start_manager):
+    path = write_config("""
+        db: !ShellProcess
+          command: "sleep 0.3; echo ready; exec sleep 30"
+          readiness:
+            log_line: ready
+            timeout: 5
+        api: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [db]
+        """)
+    manager = start_manager(path)
+    db, api = manager.processes["db"], manager.processes["api"]
+    assert api.status == "running"
+    assert db.output.contains("ready", 0)
+    assert api.started_at - db.started_at >= 0.3
+
+
+def test_dependents_of_unready_process_are_skipped(write_config, start_manager):
+    path = write_config("""
+        db: !ShellProcess
+          command: "exec sleep 30"
+          readiness:
+            log_line: never printed
+            timeout: 0.3
+        api: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [db]
+        """)
+    manager = start_manager(path)
+    assert manager.processes["db"].status == "running"
+    assert manager.processes["api"].status == "not started"
+
+
+def test_dependents_stop_first(write_config, start_manager):
+    path = write_config("""
+        db: !ShellProcess
+          command: "exec sleep 30"
+        api: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [db]
+        """)
+    manager = start_manager(path)
+    manager.stop_all()
+    db, api = manager.processes["db"], manager.processes["api"]
+    assert db.status == api.status == "stopped"
+    assert api.stopped_at <= db.stopped_at
@@ -0,0 +1,124 @@
+import pytest
+from conftest import wait_for
+from fastapi.testclient import TestClient
+
+from proman.server import ProcessManagerWebInterface
+
+CONFIG = """
+    web-a: !ShellProcess
+      command: "exec sleep 30"
+      tags: [web]
+    web-b: !ShellProcess
+      command: "exec sleep 30"
+      tags: [web]
+    worker: !ShellProcess
+      command: "exec sleep 30"
+      active: false
+    migrate: !ShellProcess
+      command: "exit 1"
+      readiness:
+        exit_code: 0
+      active: false
+    """
+
+
+@pytest.fixture
+def client(write_config):
+    interface = ProcessManagerWebInterface(write_config(CONFIG), headless=True)
+    # Leaving the client shuts the interface down, stopping the processes.
+    with TestClient(interface.app) as client:
+        client.interface = interface
+        yield client
+
+
+def wait_job(client, job_id):
+    def finished():
+        job = client.get(f"/api/jobs/{job_id}").json()
+        return job["state"] in ("done", "failed")
+
+    assert wait_for(finished)
+    return client.get(f"/api/jobs/{job_id}").json()
+
+
+def test_status(client):
+    response = client.get("/api/status")
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "4"
+    assert response.json()["web-a"] == {"status": "running", "health": None}
+    assert response.json()["worker"]["status"] == "not started"
+
+    page = client.get("/api/status", params={"fields": "pid", "offset": 1, "limit": 1})
+    assert list(page.json()) == ["web-b"]
+    assert list(page.json()["web-b"]) == ["pid"]
+
+
+def test_unchanged_status_is_not_modified(client):
+    etag = client.get("/api/status").headers["ETag"]
+    response = client.get("/api/status", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+def test_etag_depends_on_the_query(client):
+    etag = client.get("/api/status").headers["ETag"]
+    response = client.get(
+        "/api/status", params={"fields": "all"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etag_changes_with_the_processes(client):
+    etag = client.get("/api/status").headers["ETag"]
+    client.interface.manager.stop_process("web-a")
+    response = client.get("/api/status", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["web-a"]["status"] == "stopped"
+
+
+def test_bulk_stop_by_tag(client):
+    response = client.post("/api/bulk/stop", json={"tag": "web"})
+    assert response.status_code == 202
+    job = wait_job(client, response.json()["job"])
+    assert job["state"] == "done"
+    assert job["progress"] == {"done": 2, "total": 2}
+    assert job["result"] == {
+        "web-a": {"result": "ok", "status": "stopped"},
+        "web-b": {"result": "ok", "status": "stopped"},
+    }
+    assert client.interface.manager.processes["worker"].status == "not started"
+
+
+def test_bulk_start_in_batches(client):
+    response = client.post(
+        "/api/bulk/start", json={"names": ["worker", "missing"], "batch_size": 1}
+    )
+    job = wait_job(client, response.json()["job"])
+    assert job["result"] == {
+        "worker": {"result": "ok", "status": "running"},
+        "missing": {"result": "not found"},
+    }
+
+
+def test_bulk_halts_after_a_failing_batch(client):
+    response = client.post(
+        "/api/bulk/start", json={"names": ["migrate", "worker"], "batch_size": 1}
+    )
+    job = wait_job(client, response.json()["job"])
+    assert job["result"]["migrate"]["result"] == "failed"
+    assert job["result"]["worker"] == {"result": "skipped"}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [{"tag": "web", "parallelism": 0}, {"tag": "web", "batch_size": 0}],
+)
+def test_bulk_rejects_invalid_sizes(client, body):
+    assert client.post("/api/bulk/stop", json=body).status_code == 422
+
+
+def test_bulk_errors(client):
+    assert client.post("/api/bulk/kill", json={"tag": "web"}).status_code == 404
+    assert client.post("/api/bulk/stop", json={"tag": "none"}).status_code == 404
@@ -0,0 +1,82 @@
+import json
+import os
+import signal
+
+from conftest import wait_for
+
+from proman.config import ConfigParser
+from proman.state import StateStore, proc_start_time
+
+CONFIG = """
+    detached: !ShellProcess
+      command: "exec sleep 30"
+      capture_output: false
+    captured: !ShellProcess
+      command: "exec sleep 30"
+    """
+
+
+def restart_proman(path, state_file):
+    """Shut down a first proman, leaving its detachable children running."""
+    manager = ConfigParser(path, cache=False).init_process_manager(
+        state_file=state_file
+    )
+    pids = {name: proc.process.pid for name, proc in manager.processes.items()}
+    manager.shutdown()
+    return pids
+
+
+def test_state_store_roundtrip(tmp_path):
+    store = StateStore(tmp_path / "state.json")
+    store.set("app", {"pid": 1})
+    store.set("other", {"pid": 2})
+    store.discard("other")
+    store.flush()
+    assert json.loads((tmp_path / "state.json").read_text()) == {"app": {"pid": 1}}
+    assert StateStore(tmp_path / "state.json").get("app") == {"pid": 1}
+
+
+def test_children_are_adopted(tmp_path, write_config, start_manager):
+    path = write_config(CONFIG)
+    state_file = tmp_path / "state.json"
+    pids = restart_proman(path, state_file)
+    # Only the child not writing into a pipe to proman outlives it.
+    assert proc_start_time(pids["detached"]) is not None
+    assert proc_start_time(pids["captured"]) is None
+    assert list(json.loads(state_file.read_text())) == ["detached"]
+
+    manager = start_manager(path, state_file=state_file)
+    detached = manager.processes["detached"]
+    assert detached.status == "running"
+    assert detached.process.pid == pids["detached"]
+    assert manager.processes["captured"].process.pid != pids["captured"]
+
+    manager.stop_process("detached")
+    assert proc_start_time(pids["detached"]) is None
+    assert manager.state.get("detached") is None
+
+
+def test_changed_process_is_not_adopted(tmp_path, write_config, start_manager):
+    path = write_config(CONFIG)
+    state_file = tmp_path / "state.json"
+    pids = restart_proman(path, state_file)
+    try:
+        write_config(CONFIG.replace("sleep 30", "sleep 31"))
+        manager = start_manager(path, state_file=state_file)
+        assert manager.processes["detached"].process.pid != pids["detached"]
+    finally:
+        os.kill(pids["detached"], signal.SIGKILL)
+
+
+def test_exited_child_is_not_adopted(tmp_path, write_config, start_manager):
+    path = write_config(CONFIG)
+    state_file = tmp_path / "state.json"
+    pids = restart_proman(path, state_file)
+    os.kill(pids["detached"], signal.SIGKILL)
+    # Still proman's child: reaped by its supervisor.
+    assert wait_for(lambda: proc_start_time(pids["detached"]) is None)
+
+    manager = start_manager(path, state_file=state_file)
+    detached = manager.processes["detached"]
+    assert detached.status == "running"
+    assert detached.process.pid != pids["detached"]
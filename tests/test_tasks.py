@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from conftest import wait_for
+
+from proman.tasks import CronSchedule, TimerQueue, parse_schedule
+
+
+def test_cron_schedule():
+    schedule = CronSchedule("30 2 * * 1-5")
+    # Saturday 2024-06-01 00:00, the next weekday at 2:30 is Monday.
+    after = datetime(2024, 6, 1).timestamp()
+    assert datetime.fromtimestamp(schedule.next_time(after)) == datetime(
+        2024, 6, 3, 2, 30
+    )
+
+
+def test_no_schedule():
+    assert parse_schedule(None) is None
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"cron": "* * *"},
+        {"cron": "0 0 30 2 *"},
+        {"every": 0},
+        {"every": 1, "cron": "*"},
+    ],
+)
+def test_invalid_schedules(config):
+    with pytest.raises(ValueError):
+        parse_schedule(config)
+
+
+def test_timer_queue_runs_due_timers_in_order():
+    timers = TimerQueue()
+    fired = []
+    done = threading.Event()
+    now = time.time()
+    timers.call_at(now + 0.1, fired.append, "second")
+    timers.call_at(now + 0.05, fired.append, "first")
+    timers.call_at(now + 0.07, fired.append, "cancelled").cancel()
+    timers.call_at(now + 0.15, done.set)
+    assert done.wait(5)
+    assert fired == ["first", "second"]
+    timers.close()
+
+
+def test_timer_queue_survives_failing_callbacks():
+    timers = TimerQueue()
+    done = threading.Event()
+    timers.call_later(0, lambda: 1 / 0)
+    timers.call_later(0.01, done.set)
+    assert done.wait(5)
+    timers.close()
+
+
+def test_task_dependency(write_config, start_manager):
+    path = write_config("""
+        migrate: !TaskProcess
+          command: "sleep 0.2"
+        api: !ShellProcess
+          command: "exec sleep 30"
+          depends_on: [migrate]
+        """)
+    manager = start_manager(path)
+    migrate, api = manager.processes["migrate"], manager.processes["api"]
+    assert migrate.history[-1]["exit_code"] == 0
+    assert api.status == "running"
+
+
+def test_task_retries(write_config, start_manager):
+    path = write_config("""
+        flaky: !TaskProcess
+          command: "exit 1"
+          retries: 2
+          retry_delay: 0.01
+        """)
+    flaky = start_manager(path).processes["flaky"]
+    assert wait_for(lambda: flaky.status == "failed")
+    assert [run["attempt"] for run in flaky.history] == [1, 2, 3]
+
+
+def test_scheduled_task(write_config, start_manager):
+    path = write_config("""
+        tick: !TaskProcess
+          command: "true"
+          schedule: {every: 0.05}
+        """)
+    manager = start_manager(path)
+    tick = manager.processes["tick"]
+    assert wait_for(lambda: len(tick.history) >= 3)
+    assert all(run["trigger"] == "schedule" for run in tick.history)
+    manager.stop_process("tick")
+    runs = len(tick.history)
+    time.sleep(0.2)
+    assert len(tick.history) == runs
+    assert tick.next_run is None